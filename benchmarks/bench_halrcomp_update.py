@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Throughput of applying halrcomp incremental updates to remote components.
+
+Compares the per-handle decoders of halrcomp_incremental_update_received
+with the former HasField based pin_update path, with and without a
+value watcher on every pin.
+"""
+import timeit
+
+from machinetalk.protobuf.message_pb2 import Container
+from pymachinetalk.machinetalk_core.common.reactor import (
+    set_default_reactor,
+    use_shared_reactor,
+)
+from pymachinetalk import halremote
+
+ITERATIONS = 20
+
+
+def create_component(pins):
+    rcomp = halremote.RemoteComponent('bench')
+    for i in range(pins):
+        rcomp.newpin('pin%i' % i, halremote.HAL_FLOAT, halremote.HAL_IN)
+
+    rx = Container()
+    comp = rx.comp.add()
+    comp.name = 'bench'
+    for i, name in enumerate(rcomp.pinsbyname):
+        rpin = comp.pin.add()
+        rpin.name = 'bench.%s' % name
+        rpin.handle = i + 1
+        rpin.type = halremote.HAL_FLOAT
+        rpin.halfloat = 0.0
+    rcomp.halrcomp_full_update_received('bench', rx)
+    return rcomp
+
+
+def incremental_update(pins, value):
+    rx = Container()
+    for i in range(pins):
+        rpin = rx.pin.add()
+        rpin.handle = i + 1
+        rpin.halfloat = value
+    return rx
+
+
+def legacy_update(rcomp, rx):
+    for rpin in rx.pin:
+        lpin = rcomp.pinsbyhandle[rpin.handle]
+        rcomp.pin_update(rpin, lpin)
+
+
+def run(pins, watched):
+    rcomp = create_component(pins)
+    if watched:
+        for pin in rcomp.pinsbyname.values():
+            pin.on_value_changed.append(lambda value: None)
+    updates = [incremental_update(pins, float(i)) for i in range(2)]
+
+    for label, func in (
+        ('legacy', lambda rx: legacy_update(rcomp, rx)),
+        ('decoders', lambda rx: rcomp.halrcomp_incremental_update_received('', rx)),
+    ):
+        counter = iter(range(ITERATIONS * 2))
+        seconds = timeit.timeit(
+            lambda: func(updates[next(counter) % 2]), number=ITERATIONS
+        )
+        print(
+            '%6i pins %-9s %-9s %8.0f pins/s %8.2f ms/msg'
+            % (
+                pins,
+                'watched' if watched else 'unwatched',
+                label,
+                pins * ITERATIONS / seconds,
+                seconds / ITERATIONS * 1e3,
+            )
+        )
+
+
+if __name__ == '__main__':
+    reactor = use_shared_reactor()
+    for pins in (1000, 10000):
+        for watched in (False, True):
+            run(pins, watched)
+    set_default_reactor(None)
+    reactor.stop()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""CPU time per received ping, full protobuf parse vs. type peek.
+
+Runs the codecs used by the channels on MT_PING and MT_PING_ACKNOWLEDGE
+messages, both from bytes and from zero-copy frame buffers.
+"""
+import timeit
+
+import machinetalk.protobuf.types_pb2 as pb
+from machinetalk.protobuf.message_pb2 import Container
+from pymachinetalk.machinetalk_core.common.codec import (
+    Codec,
+    LazyCodec,
+    protobuf_backend,
+)
+
+ITERATIONS = 200000
+
+
+def encoded(msg_type):
+    tx = Container()
+    tx.type = msg_type
+    return tx.SerializeToString()
+
+
+def run(name, data):
+    rx = Container()
+    for label, codec in (('full', Codec()), ('lazy', LazyCodec())):
+        seconds = timeit.timeit(lambda: codec.decode(data, rx), number=ITERATIONS)
+        print(
+            '%-20s %-5s %10.0f msg/s %6.2f us/msg'
+            % (name, label, ITERATIONS / seconds, seconds / ITERATIONS * 1e6)
+        )
+
+
+if __name__ == '__main__':
+    print('protobuf backend: %s' % protobuf_backend())
+    run('ping', encoded(pb.MT_PING))
+    run('ping acknowledge', encoded(pb.MT_PING_ACKNOWLEDGE))
+    run('ping (zero copy)', memoryview(encoded(pb.MT_PING)))
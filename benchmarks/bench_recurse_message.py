@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Throughput of applying emc_status_motion updates to status objects.
+
+Compares the precompiled per-descriptor updaters of recurse_message with
+the former descriptor walk, which is kept here as reference.
+"""
+import timeit
+
+from machinetalk.protobuf.message_pb2 import Container
+from pymachinetalk.common import MessageObject, recurse_descriptor, recurse_message
+
+ITERATIONS = 20000
+
+
+def legacy_recurse_message(message, obj, field_filter=''):
+    for descriptor in message.DESCRIPTOR.fields:
+        filter_enabled = field_filter != ''
+
+        if descriptor.number in obj.id_map:
+            name = obj.id_map[descriptor.number]
+        else:
+            continue
+
+        if filter_enabled and name != field_filter:
+            continue
+
+        if descriptor.label != descriptor.LABEL_REPEATED:
+            if message.HasField(name):
+                if descriptor.type == descriptor.TYPE_MESSAGE:
+                    sub_obj = getattr(obj, name)
+                    legacy_recurse_message(getattr(message, name), sub_obj)
+                else:
+                    setattr(obj, name, getattr(message, name))
+        else:
+            if descriptor.type == descriptor.TYPE_MESSAGE:
+                array = getattr(obj, name)
+                repeated = getattr(message, name)
+                for sub_message in repeated:
+                    index = sub_message.index
+
+                    while len(array) < (index + 1):
+                        array.append(MessageObject())
+
+                    if len(sub_message.DESCRIPTOR.fields) == 2:
+                        sub_obj = MessageObject()
+                        recurse_descriptor(sub_message.DESCRIPTOR, sub_obj)
+                        legacy_recurse_message(sub_message, sub_obj)
+                        delattr(sub_obj, 'index')
+                        value = getattr(sub_obj, dir(sub_obj)[-1])
+                    else:
+                        sub_obj = array[index]
+                        legacy_recurse_message(sub_message, sub_obj)
+                        value = sub_obj
+                    array[index] = value
+
+
+def incremental_update():
+    """Typical update while a program is running: positions and feed."""
+    motion = Container().emc_status_motion
+    for position in (motion.position, motion.actual_position, motion.dtg):
+        position.x = 12.5
+        position.y = -3.25
+        position.z = 1.0
+    motion.current_vel = 25.0
+    motion.distance_to_go = 4.2
+    motion.current_line = 42
+    axis = motion.axis.add()
+    axis.index = 0
+    axis.ferror_current = 0.001
+    axis.input = 12.5
+    axis.output = 12.5
+    return motion
+
+
+def full_update():
+    """Update after (re)connect carrying all axes and I/O."""
+    motion = incremental_update()
+    for index in range(1, 3):
+        axis = motion.axis.add()
+        axis.index = index
+        axis.homed = True
+        axis.enabled = True
+        axis.input = 1.0
+        axis.output = 1.0
+    for index in range(16):
+        din = motion.din.add()
+        din.index = index
+        din.value = bool(index % 2)
+        ain = motion.ain.add()
+        ain.index = index
+        ain.value = index * 0.5
+    return motion
+
+
+def new_object():
+    obj = MessageObject()
+    recurse_descriptor(Container().emc_status_motion.DESCRIPTOR, obj)
+    return obj
+
+
+def run(name, message):
+    for label, func in (
+        ('legacy', legacy_recurse_message),
+        ('compiled', recurse_message),
+    ):
+        obj = new_object()
+        func(message, obj)  # warm up, grows the repeated fields
+        seconds = timeit.timeit(lambda: func(message, obj), number=ITERATIONS)
+        print(
+            '%-12s %-9s %8.0f msg/s %6.1f us/msg'
+            % (name, label, ITERATIONS / seconds, seconds / ITERATIONS * 1e6)
+        )
+
+
+if __name__ == '__main__':
+    run('incremental', incremental_update())
+    run('full', full_update())
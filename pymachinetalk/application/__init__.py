@@ -5,3 +5,4 @@ from .error import ApplicationError
 from .file import ApplicationFile
 from .log import ApplicationLog
 from .status import ApplicationStatus
+from .streamer import MdiStreamer, JogStreamer
@@ -1,8 +1,13 @@
 # coding=utf-8
+import asyncio
+import itertools
 import threading
+from concurrent.futures import CancelledError, Future, TimeoutError
 
 from machinetalk.protobuf.message_pb2 import Container
+from machinetalk.protobuf.types_pb2 import MT_EMC_TASK_ABORT, MT_EMC_TASK_SET_STATE
 from .constants import (
+    EMC_TASK_STATE_ESTOP,
     ENGAGE_BRAKE,
     RELEASE_BRAKE,
     JOG_STOP,
@@ -15,9 +20,10 @@ from .constants import (
     SPINDLE_DECREASE,
     SPINDLE_CONSTANT,
 )
-from ..common import ComponentBase
+from ..common import ComponentBase, wait_for_callback
 from ..dns_sd import ServiceContainer, Service
 from ..machinetalk_core.application.commandbase import CommandBase
+from ..machinetalk_core.common.metrics import CommandLatencyMetrics, perf_counter_ns
 
 
 class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
@@ -32,17 +38,29 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
 
         # callbacks
         self.on_connected_changed = []
+        self.on_executed_ticket_changed = []
+        self.on_completed_ticket_changed = []
 
         self.connected = False
 
         self.ticket = 0  # stores the local ticket number
         self.executed_ticket = 0  # last tick number from executed feedback
         self.completed_ticket = 0  # last tick number from executed feedback
-        self._executed_updated = False
-        self._completed_updated = False
-
-        # more efficient to reuse a protobuf message
-        self._tx = Container()
+        # ticket -> future, only pending tickets somebody waits for are kept
+        self._executed_futures = {}
+        self._completed_futures = {}
+        # priority tickets may overtake queued ones, their replies only
+        # acknowledge themselves and are kept until the order catches up
+        self._priority_tickets = set()
+        self._early_executed = set()
+        self._early_completed = set()
+        self._abort_ticket = 0  # older commands not sent yet are dropped
+
+        self.latency_metrics = None
+        self._tickets = itertools.count(1)
+        # keeps tickets in send order, messages are built outside of it
+        self._send_lock = threading.Lock()
+        self._ticket_lock = threading.Lock()  # self.ticket never decreases
 
         self._command_service = Service(type_='command')
         self.add_service(self._command_service)
@@ -53,50 +71,156 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         self.ready = ready
 
     def emccmd_executed_received(self, rx):
+        exact = rx.reply_ticket in self._priority_tickets
+        if self.latency_metrics is not None:
+            self.latency_metrics.command_executed(
+                rx.reply_ticket, perf_counter_ns(), exact
+            )
         with self.executed_condition:
-            self.executed_ticket = rx.reply_ticket
-            self._executed_updated = True
+            self.executed_ticket, resolved = self._reply_received(
+                rx.reply_ticket,
+                exact,
+                self.executed_ticket,
+                self._executed_futures,
+                self._early_executed,
+            )
             self.executed_condition.notify()
+        self._resolve(resolved)
+        for cb in self.on_executed_ticket_changed:
+            cb(rx.reply_ticket)
 
     def emccmd_completed_received(self, rx):
+        exact = rx.reply_ticket in self._priority_tickets
+        if self.latency_metrics is not None:
+            self.latency_metrics.command_completed(
+                rx.reply_ticket, perf_counter_ns(), exact
+            )
         with self.completed_condition:
-            self.completed_ticket = rx.reply_ticket
-            self._completed_updated = True
+            self.completed_ticket, resolved = self._reply_received(
+                rx.reply_ticket,
+                exact,
+                self.completed_ticket,
+                self._completed_futures,
+                self._early_completed,
+            )
             self.completed_condition.notify()
+        self._priority_tickets.discard(rx.reply_ticket)
+        self._resolve(resolved)
+        for cb in self.on_completed_ticket_changed:
+            cb(rx.reply_ticket)
 
-    def wait_executed(self, ticket=None, timeout=None):
+    def executed_future(self, ticket=None):
+        """Returns a concurrent.futures.Future resolved once ticket is executed.
+
+        Defaults to the last ticket. The future is cancelled when the
+        connection is lost before the reply arrives.
+        """
         with self.executed_condition:
-            if ticket is None:
-                ticket = self.ticket
-            if (
-                ticket and ticket <= self.executed_ticket
-            ):  # very likely that we already received the reply
-                return True
+            return self._ticket_future(
+                ticket,
+                self.executed_ticket,
+                self._executed_futures,
+                self._early_executed,
+            )
+
+    def completed_future(self, ticket=None):
+        """Returns a concurrent.futures.Future resolved once ticket is completed."""
+        with self.completed_condition:
+            return self._ticket_future(
+                ticket,
+                self.completed_ticket,
+                self._completed_futures,
+                self._early_completed,
+            )
+
+    # must be called with the condition of the futures held
+    def _ticket_future(self, ticket, reply_ticket, futures, early):
+        if ticket is None:
+            ticket = self.ticket
+        future = futures.get(ticket)
+        if future is None:
+            future = Future()
+            if ticket <= reply_ticket or ticket in early:  # reply already received
+                future.set_result(True)
+            elif ticket < self._abort_ticket:  # dropped by an abort or estop
+                future.cancel()
+            else:
+                futures[ticket] = future
+        return future
+
+    # must be called with the condition of the futures held
+    @staticmethod
+    def _reply_received(reply_ticket, exact, last_ticket, futures, early):
+        """Returns the new in order reply ticket and the futures to resolve."""
+        if exact and reply_ticket > last_ticket:
+            early.add(reply_ticket)
+            future = futures.pop(reply_ticket, None)
+            return last_ticket, [future] if future is not None else []
+        early.difference_update([ticket for ticket in early if ticket <= reply_ticket])
+        tickets = [ticket for ticket in futures if ticket <= reply_ticket]
+        return reply_ticket, [futures.pop(ticket) for ticket in tickets]
+
+    @staticmethod
+    def _resolve(futures):
+        for future in futures:
+            # skips futures cancelled by the waiter, set_result does not
+            # check the state before Python 3.8
+            if future.set_running_or_notify_cancel():
+                future.set_result(True)
+
+    def _cancel_futures(self):
+        with self.executed_condition:
+            futures = list(self._executed_futures.values())
+            self._executed_futures.clear()
+            self._early_executed.clear()
+        with self.completed_condition:
+            futures.extend(self._completed_futures.values())
+            self._completed_futures.clear()
+            self._early_completed.clear()
+        self._priority_tickets.clear()
+        for future in futures:
+            future.cancel()
+
+    def _cancel_futures_before(self, ticket):
+        with self.executed_condition, self.completed_condition:
+            self._abort_ticket = max(self._abort_ticket, ticket)
+            futures = self._pop_futures_before(self._executed_futures, ticket)
+            futures.extend(self._pop_futures_before(self._completed_futures, ticket))
+        for future in futures:
+            future.cancel()
+
+    # must be called with the condition of the futures held
+    @staticmethod
+    def _pop_futures_before(futures, ticket):
+        tickets = [pending for pending in futures if pending < ticket]
+        return [futures.pop(pending) for pending in tickets]
+
+    @staticmethod
+    def _wait_future(future, timeout):
+        try:
+            return future.result(timeout=timeout)
+        except (TimeoutError, CancelledError):
+            return False
+
+    @staticmethod
+    async def _wait_future_async(future, timeout):
+        try:
+            # shielded, a timeout must not cancel the future of other waiters
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), timeout
+            )
+        except asyncio.TimeoutError:
+            return False
+        except asyncio.CancelledError:
+            if future.cancelled():  # connection lost
+                return False
+            raise
 
-            while True:
-                self._executed_updated = False
-                self.executed_condition.wait(timeout=timeout)
-                if not self._executed_updated:
-                    return False  # timeout
-                if ticket == self.executed_ticket:
-                    return True
+    def wait_executed(self, ticket=None, timeout=None):
+        return self._wait_future(self.executed_future(ticket), timeout)
 
     def wait_completed(self, ticket=None, timeout=None):
-        with self.completed_condition:
-            if ticket is None:
-                ticket = self.ticket
-            if (
-                ticket and ticket < self.completed_ticket
-            ):  # very likely that we already received the reply
-                return True
-
-            while True:
-                self._completed_updated = False
-                self.completed_condition.wait(timeout=timeout)
-                if not self._completed_updated:
-                    return False  # timeout
-                if ticket == self.completed_ticket:
-                    return True
+        return self._wait_future(self.completed_future(ticket), timeout)
 
     def wait_connected(self, timeout=None):
         with self.connected_condition:
@@ -105,6 +229,17 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
             self.connected_condition.wait(timeout=timeout)
             return self.connected
 
+    async def wait_executed_async(self, ticket=None, timeout=None):
+        return await self._wait_future_async(self.executed_future(ticket), timeout)
+
+    async def wait_completed_async(self, ticket=None, timeout=None):
+        return await self._wait_future_async(self.completed_future(ticket), timeout)
+
+    async def wait_connected_async(self, timeout=None):
+        return await wait_for_callback(
+            self.on_connected_changed, lambda: self.connected, timeout
+        )
+
     # slot
     def set_connected(self):
         self._update_connected(True)
@@ -117,201 +252,246 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         with self.connected_condition:
             self.connected = connected
             self.connected_condition.notify()
+        if not connected:
+            self._cancel_futures()  # replies of pending tickets are lost
+            if self.latency_metrics is not None:
+                self.latency_metrics.clear_pending()
         for cb in self.on_connected_changed:
             cb(connected)
 
-    def _take_ticket(self):
-        self.ticket += 1
-        self._tx.ticket = self.ticket
-        return self.ticket
+    def enable_metrics(self):
+        """Also records the round-trip latencies of commands."""
+        ComponentBase.enable_metrics(self)
+        if self.latency_metrics is None:
+            self.latency_metrics = CommandLatencyMetrics()
+
+    def disable_metrics(self):
+        ComponentBase.disable_metrics(self)
+        self.latency_metrics = None
+
+    def send_command_message(self, msg_type, tx, priority=False):
+        if self.latency_metrics is not None:
+            self.latency_metrics.command_sent(tx.ticket, msg_type, perf_counter_ns())
+        self._command_channel.send_socket_message(msg_type, tx, priority=priority)
+
+    def _send(self, send, tx):
+        with self._send_lock:
+            ticket = next(self._tickets)
+            tx.ticket = ticket
+            send(tx)
+            self._update_ticket(ticket)
+        return ticket
+
+    def _send_priority(self, msg_type, tx):
+        # bypasses the send lock, a full pipe must not delay safety commands
+        ticket = next(self._tickets)
+        self._priority_tickets.add(ticket)
+        tx.ticket = ticket
+        # commands still queued must not run after an abort or estop, including
+        # the ones of threads that took their ticket but did not queue it yet
+        self._command_channel.discard_queued_messages(ticket)
+        self.send_command_message(msg_type, tx, priority=True)
+        self._cancel_futures_before(ticket)
+        if self.latency_metrics is not None:
+            self.latency_metrics.clear_pending(before=ticket)
+        self._update_ticket(ticket)
+        return ticket
+
+    def _update_ticket(self, ticket):
+        # priority sends are not ordered by the send lock
+        with self._ticket_lock:
+            if ticket > self.ticket:
+                self.ticket = ticket
 
     def abort(self, interpreter='execute'):
         if not self.connected:
             return None
 
-        self._tx.interp_name = interpreter
+        tx = Container()
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_abort(self._tx)
+        ticket = self._send_priority(MT_EMC_TASK_ABORT, tx)
         return ticket
 
     def run_program(self, line_number, interpreter='execute'):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.line_number = line_number
-        self._tx.interp_name = interpreter
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_run(self._tx)
+        ticket = self._send(self.send_emc_task_plan_run, tx)
         return ticket
 
     def pause_program(self, interpreter='execute'):
         if not self.connected:
             return None
 
-        self._tx.interp_name = interpreter
+        tx = Container()
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_pause(self._tx)
+        ticket = self._send(self.send_emc_task_plan_pause, tx)
         return ticket
 
     def step_program(self, interpreter='execute'):
         if not self.connected:
             return None
 
-        self._tx.interp_name = interpreter
+        tx = Container()
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_step(self._tx)
+        ticket = self._send(self.send_emc_task_plan_step, tx)
         return ticket
 
     def resume_program(self, interpreter='execute'):
         if not self.connected:
             return None
 
-        self._tx.interp_name = interpreter
+        tx = Container()
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_resume(self._tx)
+        ticket = self._send(self.send_emc_task_plan_resume, tx)
         return ticket
 
     def set_task_mode(self, mode, interpreter='execute'):
         if not self.connected:
             return
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.task_mode = mode
-        self._tx.interp_name = interpreter
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_set_mode(self._tx)
+        ticket = self._send(self.send_emc_task_set_mode, tx)
         return ticket
 
     def set_task_state(self, state, interpreter='execute'):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.task_state = state
-        self._tx.interp_name = interpreter
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_set_state(self._tx)
+        if state == EMC_TASK_STATE_ESTOP:
+            ticket = self._send_priority(MT_EMC_TASK_SET_STATE, tx)
+        else:
+            ticket = self._send(self.send_emc_task_set_state, tx)
         return ticket
 
     def open_program(self, file_name, interpreter='execute'):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.path = file_name
-        self._tx.interp_name = interpreter
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_open(self._tx)
+        ticket = self._send(self.send_emc_task_plan_open, tx)
         return ticket
 
     def reset_program(self, interpreter='execute'):
         if not self.connected:
             return None
 
-        self._tx.interp_name = interpreter
+        tx = Container()
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_init(self._tx)
+        ticket = self._send(self.send_emc_task_plan_init, tx)
         return ticket
 
     def execute_mdi(self, command, interpreter='execute'):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.command = command
-        self._tx.interp_name = interpreter
+        tx.interp_name = interpreter
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_execute(self._tx)
+        ticket = self._send(self.send_emc_task_plan_execute, tx)
         return ticket
 
     def set_spindle_brake(self, brake):
         if not self.connected:
             return None
 
-        ticket = self._take_ticket()
+        tx = Container()
         if brake == ENGAGE_BRAKE:
-            self.send_emc_spindle_brake_engage(self._tx)
+            ticket = self._send(self.send_emc_spindle_brake_engage, tx)
         elif brake == RELEASE_BRAKE:
-            self.send_emc_spindle_brake_release(self._tx)
+            ticket = self._send(self.send_emc_spindle_brake_release, tx)
+        else:
+            return None
         return ticket
 
     def set_debug_level(self, debug_level):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.debug_level = debug_level
-        self._tx.interp_name = debug_level
+        tx.interp_name = debug_level
 
-        ticket = self._take_ticket()
-        self.send_emc_set_debug(self._tx)
+        ticket = self._send(self.send_emc_set_debug, tx)
         return ticket
 
     def set_feed_override(self, scale):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.scale = scale
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_scale(self._tx)
+        ticket = self._send(self.send_emc_traj_set_scale, tx)
         return ticket
 
     def set_flood_enabled(self, enable):
         if not self.connected:
             return None
 
-        ticket = self._take_ticket()
+        tx = Container()
         if enable:
-            self.send_emc_coolant_flood_on(self._tx)
+            ticket = self._send(self.send_emc_coolant_flood_on, tx)
         else:
-            self.send_emc_coolant_flood_off(self._tx)
+            ticket = self._send(self.send_emc_coolant_flood_off, tx)
         return ticket
 
     def home_axis(self, index):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = index
 
-        ticket = self._take_ticket()
-        self.send_emc_axis_home(self._tx)
+        ticket = self._send(self.send_emc_axis_home, tx)
         return ticket
 
     def jog(self, jog_type, axis, velocity=0.0, distance=0.0):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = axis
 
         if jog_type == JOG_STOP:
-            ticket = self._take_ticket()
-            self.send_emc_axis_abort(self._tx)
+            ticket = self._send(self.send_emc_axis_abort, tx)
         elif jog_type == JOG_CONTINUOUS:
             params.velocity = velocity
-            ticket = self._take_ticket()
-            self.send_emc_axis_jog(self._tx)
+            ticket = self._send(self.send_emc_axis_jog, tx)
         elif jog_type == JOG_INCREMENT:
             params.velocity = velocity
             params.distance = distance
-            ticket = self._take_ticket()
-            self.send_emc_axis_incr_jog(self._tx)
+            ticket = self._send(self.send_emc_axis_incr_jog, tx)
         else:
-            self._tx.Clear()
             return None
 
         return ticket
@@ -320,8 +500,8 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         if not self.connected:
             return None
 
-        ticket = self._take_ticket()
-        self.send_emc_tool_load_tool_table(self._tx)
+        tx = Container()
+        ticket = self._send(self.send_emc_tool_load_tool_table, tx)
         return ticket
 
     def update_tool_table(self, tool_table):
@@ -331,173 +511,167 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.velocity = velocity
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_max_velocity(self._tx)
+        ticket = self._send(self.send_emc_traj_set_max_velocity, tx)
         return ticket
 
     def set_mist_enabled(self, enable):
         if not self.connected:
             return None
 
-        ticket = self._take_ticket()
+        tx = Container()
         if enable:
-            self.send_emc_coolant_mist_on(self._tx)
+            ticket = self._send(self.send_emc_coolant_mist_on, tx)
         else:
-            self.send_emc_coolant_mist_off(self._tx)
+            ticket = self._send(self.send_emc_coolant_mist_off, tx)
         return ticket
 
     def override_limits(self):
         if not self.connected:
             return None
 
-        ticket = self._take_ticket()
-        self.send_emc_axis_override_limits(self._tx)
+        tx = Container()
+        ticket = self._send(self.send_emc_axis_override_limits, tx)
         return ticket
 
     def set_adaptive_feed_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_motion_adaptive(self._tx)
+        ticket = self._send(self.send_emc_motion_adaptive, tx)
         return ticket
 
     def set_analog_output(self, index, value):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = index
         params.value = value
 
-        ticket = self._take_ticket()
-        self.send_emc_motion_set_aout(self._tx)
+        ticket = self._send(self.send_emc_motion_set_aout, tx)
         return ticket
 
     def set_block_delete_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_set_block_delete(self._tx)
+        ticket = self._send(self.send_emc_task_plan_set_block_delete, tx)
         return ticket
 
     def set_digital_output(self, index, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = index
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_motion_set_dout(self._tx)
+        ticket = self._send(self.send_emc_motion_set_dout, tx)
         return ticket
 
     def set_feed_hold_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_fh_enable(self._tx)
+        ticket = self._send(self.send_emc_traj_set_fh_enable, tx)
         return ticket
 
     def set_feed_override_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_fo_enable(self._tx)
+        ticket = self._send(self.send_emc_traj_set_fo_enable, tx)
         return ticket
 
     def set_axis_max_position_limit(self, axis, value):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = axis
         params.value = value
 
-        ticket = self._take_ticket()
-        self.send_emc_axis_set_max_position_limit(self._tx)
+        ticket = self._send(self.send_emc_axis_set_max_position_limit, tx)
         return ticket
 
     def set_axis_min_position_limit(self, axis, value):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = axis
         params.value = value
 
-        ticket = self._take_ticket()
-        self.send_emc_axis_set_min_position_limit(self._tx)
+        ticket = self._send(self.send_emc_axis_set_min_position_limit, tx)
         return ticket
 
     def set_optional_stop_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_task_plan_set_optional_stop(self._tx)
+        ticket = self._send(self.send_emc_task_plan_set_optional_stop, tx)
         return ticket
 
     def set_spindle_override_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_so_enable(self._tx)
+        ticket = self._send(self.send_emc_traj_set_so_enable, tx)
         return ticket
 
     def set_spindle(self, mode, velocity=0.0):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         if mode == SPINDLE_FORWARD:
             params.velocity = velocity
-            ticket = self._take_ticket()
-            self.send_emc_spindle_on(self._tx)
+            ticket = self._send(self.send_emc_spindle_on, tx)
         elif mode == SPINDLE_REVERSE:
             params.velocity = velocity * -1.0
-            ticket = self._take_ticket()
-            self.send_emc_spindle_on(self._tx)
+            ticket = self._send(self.send_emc_spindle_on, tx)
         elif mode == SPINDLE_OFF:
-            ticket = self._take_ticket()
-            self.send_emc_spindle_off(self._tx)
+            ticket = self._send(self.send_emc_spindle_off, tx)
         elif mode == SPINDLE_INCREASE:
-            ticket = self._take_ticket()
-            self.send_emc_spindle_increase(self._tx)
+            ticket = self._send(self.send_emc_spindle_increase, tx)
         elif mode == SPINDLE_DECREASE:
-            ticket = self._take_ticket()
-            self.send_emc_spindle_decrease(self._tx)
+            ticket = self._send(self.send_emc_spindle_decrease, tx)
         elif mode == SPINDLE_CONSTANT:
-            ticket = self._take_ticket()
-            self.send_emc_spindle_constant(self._tx)
+            ticket = self._send(self.send_emc_spindle_constant, tx)
         else:
-            self._tx.Clear()
             return None
 
         return ticket
@@ -506,29 +680,30 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.scale = scale
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_spindle_scale(self._tx)
+        ticket = self._send(self.send_emc_traj_set_spindle_scale, tx)
         return ticket
 
     def set_teleop_enabled(self, enable):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.enable = enable
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_teleop_enable(self._tx)
+        ticket = self._send(self.send_emc_traj_set_teleop_enable, tx)
         return ticket
 
     def set_teleop_vector(self, a, b, c, u, v, w):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         pose = params.pose
         pose.a = a
         pose.b = b
@@ -537,8 +712,7 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         pose.v = v
         pose.w = w
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_teleop_vector(self._tx)
+        ticket = self._send(self.send_emc_traj_set_teleop_vector, tx)
         return ticket
 
     def set_tool_offset(
@@ -547,7 +721,8 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         tooldata = params.tool_data
         tooldata.index = index
         tooldata.zoffset = zoffset
@@ -557,36 +732,35 @@ class ApplicationCommand(ComponentBase, CommandBase, ServiceContainer):
         tooldata.backangle = backangle
         tooldata.orientation = orientation
 
-        ticket = self._take_ticket()
-        self.send_emc_tool_set_offset(self._tx)
+        ticket = self._send(self.send_emc_tool_set_offset, tx)
         return ticket
 
     def set_trajectory_mode(self, mode):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.traj_mode = mode
 
-        ticket = self._take_ticket()
-        self.send_emc_traj_set_mode(self._tx)
+        ticket = self._send(self.send_emc_traj_set_mode, tx)
         return ticket
 
     def unhome_axis(self, index):
         if not self.connected:
             return None
 
-        params = self._tx.emc_command_params
+        tx = Container()
+        params = tx.emc_command_params
         params.index = index
 
-        ticket = self._take_ticket()
-        self.send_emc_axis_unhome(self._tx)
+        ticket = self._send(self.send_emc_axis_unhome, tx)
         return ticket
 
     def shutdown(self):
         if not self.connected:
             return None
 
-        ticket = self._take_ticket()
-        self.send_shutdown(self._tx)
+        tx = Container()
+        ticket = self._send(self.send_shutdown, tx)
         return ticket
@@ -1,7 +1,7 @@
 # coding=utf-8
 import threading
 
-from ..common import ComponentBase
+from ..common import ComponentBase, wait_for_callback
 from ..dns_sd import ServiceContainer, Service
 from ..machinetalk_core.application.errorbase import ErrorBase
 
@@ -37,6 +37,11 @@ class ApplicationError(ComponentBase, ErrorBase, ServiceContainer):
             self.connected_condition.wait(timeout=timeout)
             return self.connected
 
+    async def wait_connected_async(self, timeout=None):
+        return await wait_for_callback(
+            self.on_connected_changed, lambda: self.connected, timeout
+        )
+
     def emc_nml_error_received(self, _, rx):
         self._error_message_received(rx)
 
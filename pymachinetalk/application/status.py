@@ -1,5 +1,7 @@
 # coding=utf-8
 import threading
+from collections import namedtuple
+from time import monotonic
 
 from machinetalk.protobuf.message_pb2 import Container
 from machinetalk.protobuf.status_pb2 import (
@@ -7,9 +9,21 @@ from machinetalk.protobuf.status_pb2 import (
     EMC_TASK_MODE_MDI,
     EMC_TASK_INTERP_IDLE,
 )
-from ..common import ComponentBase, MessageObject, recurse_descriptor, recurse_message
+from ..common import (
+    ComponentBase,
+    FieldWatch,
+    message_class,
+    recurse_message,
+    snapshot_object,
+    wait_for_callback,
+)
 from ..dns_sd import ServiceContainer, Service
 from ..machinetalk_core.application.statusbase import StatusBase
+from ..machinetalk_core.common.reactor import create_timer
+
+StatusSnapshot = namedtuple(
+    'StatusSnapshot', ['io', 'config', 'motion', 'task', 'interp']
+)
 
 
 class ApplicationStatus(ComponentBase, StatusBase, ServiceContainer):
@@ -30,6 +44,26 @@ class ApplicationStatus(ComponentBase, StatusBase, ServiceContainer):
 
         self.synced = False
 
+        # coalescing, when set updates are published at most once per interval
+        self.coalesce_interval = 0.0
+        self._channel_conditions = {
+            'io': self.io_condition,
+            'config': self.config_condition,
+            'motion': self.motion_condition,
+            'task': self.task_condition,
+            'interp': self.interp_condition,
+        }
+        self._versions = {}  # channel -> number of the last update
+        self._field_versions = {}  # channel -> field name -> last changed version
+        self._taken_versions = {}  # channel -> version read by take_dirty_fields
+        self._snapshots = {}  # channel -> last snapshot, shared by readers
+        self._snapshot_fields = {}  # channel -> fields changed since snapshot
+        self._watches = {channel: FieldWatch() for channel in self._channel_conditions}
+        self._pending_channels = set()
+        self._publish_lock = threading.Lock()
+        self._last_publish = 0.0
+        self._publish_timer = create_timer(self._publish_pending_channels)
+
         # status containers, also used to expose data
         self._io_data = None
         self._motion_data = None
@@ -56,7 +90,7 @@ class ApplicationStatus(ComponentBase, StatusBase, ServiceContainer):
         self.ready = ready
 
     # make sure locks are used when accessing properties
-    # should we return a copy instead of the reference?
+    # these are live references, use snapshot() for a consistent copy
     @property
     def io(self):
         with self.io_condition:
@@ -82,6 +116,34 @@ class ApplicationStatus(ComponentBase, StatusBase, ServiceContainer):
         with self.interp_condition:
             return self._interp_data
 
+    def snapshot(self):
+        """Returns a consistent point-in-time copy of all status channels.
+
+        Snapshots must be treated as read-only, fields not updated since
+        the previous snapshot are shared between snapshots.
+        """
+        conditions = [self._channel_conditions[name] for name in StatusSnapshot._fields]
+        for condition in conditions:  # fixed order, updates hold a single lock
+            condition.acquire()
+        try:
+            return StatusSnapshot._make(
+                self._take_snapshot(name) for name in StatusSnapshot._fields
+            )
+        finally:
+            for condition in conditions:
+                condition.release()
+
+    # must be called with the condition of the channel held
+    def _take_snapshot(self, channel):
+        fields = self._snapshot_fields[channel]
+        snapshot = self._snapshots[channel]
+        if fields:
+            obj = getattr(self, '_%s_data' % channel)
+            snapshot = snapshot_object(obj, fields, snapshot)
+            self._snapshots[channel] = snapshot
+            self._snapshot_fields[channel] = set()
+        return snapshot
+
     def wait_synced(self, timeout=None):
         with self.synced_condition:
             if self.synced:
@@ -89,6 +151,64 @@ class ApplicationStatus(ComponentBase, StatusBase, ServiceContainer):
             self.synced_condition.wait(timeout=timeout)
             return self.synced
 
+    async def wait_synced_async(self, timeout=None):
+        return await wait_for_callback(
+            self.on_synced_changed, lambda: self.synced, timeout
+        )
+
+    def watch(self, path, callback):
+        """Calls callback(value) whenever the field at path is updated.
+
+        The path starts with the channel, e.g. 'motion.position.x'.
+        Callbacks are invoked from the channel thread after the update
+        has been applied.
+        """
+        channel, descriptor, field_path = self._resolve_watch_path(path)
+        with self._channel_conditions[channel]:
+            self._watches[channel].add(descriptor, field_path, callback)
+
+    def unwatch(self, path, callback):
+        channel, descriptor, field_path = self._resolve_watch_path(path)
+        with self._channel_conditions[channel]:
+            self._watches[channel].remove(descriptor, field_path, callback)
+
+    def _resolve_watch_path(self, path):
+        channel, _, field_path = path.partition('.')
+        if channel not in self._channel_conditions or not field_path:
+            raise ValueError('invalid status field path: %s' % path)
+        message = getattr(self._container, 'emc_status_%s' % channel)
+        return channel, message.DESCRIPTOR, field_path
+
+    def changed_fields(self, channel, since=0):
+        """Returns the version of a channel and the names of its fields changed
+        after the version passed as since.
+
+        Each consumer keeps the returned version and passes it back on the
+        next call, so consumers never see each other's reads.
+        """
+        with self._channel_conditions[channel]:
+            return self._changed_fields(channel, since)
+
+    def take_dirty_fields(self, channel):
+        """Returns the names of the fields of a channel changed since the last call.
+
+        Shared by all callers, use changed_fields with several consumers.
+        """
+        with self._channel_conditions[channel]:
+            since = self._taken_versions.get(channel, 0)
+            version, fields = self._changed_fields(channel, since)
+            self._taken_versions[channel] = version
+        return fields
+
+    # must be called with the condition of the channel held
+    def _changed_fields(self, channel, since):
+        fields = {
+            name
+            for name, changed in self._field_versions[channel].items()
+            if changed > since
+        }
+        return self._versions[channel], fields
+
     def wait_config_updated(self, timeout=None):
         with self.config_condition:
             self.config_condition.wait(timeout=timeout)
@@ -157,56 +277,97 @@ class ApplicationStatus(ComponentBase, StatusBase, ServiceContainer):
             self._initialize_object(channel)
 
     def _initialize_object(self, channel):
+        container = self._container
         if channel == 'io':
-            self._io_data = MessageObject()
-            recurse_descriptor(self._container.emc_status_io.DESCRIPTOR, self._io_data)
+            self._io_data = message_class(container.emc_status_io.DESCRIPTOR)()
         elif channel == 'config':
-            self._config_data = MessageObject()
-            recurse_descriptor(
-                self._container.emc_status_config.DESCRIPTOR, self._config_data
-            )
+            self._config_data = message_class(container.emc_status_config.DESCRIPTOR)()
         elif channel == 'motion':
-            self._motion_data = MessageObject()
-            recurse_descriptor(
-                self._container.emc_status_motion.DESCRIPTOR, self._motion_data
-            )
+            self._motion_data = message_class(container.emc_status_motion.DESCRIPTOR)()
         elif channel == 'task':
-            self._task_data = MessageObject()
-            recurse_descriptor(
-                self._container.emc_status_task.DESCRIPTOR, self._task_data
-            )
+            self._task_data = message_class(container.emc_status_task.DESCRIPTOR)()
         elif channel == 'interp':
-            self._interp_data = MessageObject()
-            recurse_descriptor(
-                self._container.emc_status_interp.DESCRIPTOR, self._interp_data
-            )
+            self._interp_data = message_class(container.emc_status_interp.DESCRIPTOR)()
+        fields = getattr(self, '_%s_data' % channel).__slots__
+        version = self._versions.get(channel, 0) + 1
+        self._versions[channel] = version
+        self._field_versions[channel] = dict.fromkeys(fields, version)
+        self._snapshot_fields[channel] = set(fields)
+        self._snapshots[channel] = None
 
     def _update_motion_object(self, data):
         with self.motion_condition:
-            recurse_message(data, self._motion_data)
-            self.motion_condition.notify()
+            fired = self._apply_update('motion', data, self._motion_data)
+            self._publish_update('motion')
+        self._notify_watchers(fired)
 
     def _update_config_object(self, data):
         with self.config_condition:
-            recurse_message(data, self._config_data)
-            self.config_condition.notify()
+            fired = self._apply_update('config', data, self._config_data)
+            self._publish_update('config')
+        self._notify_watchers(fired)
 
     def _update_io_object(self, data):
         with self.io_condition:
-            recurse_message(data, self._io_data)
-            self.io_condition.notify()
+            fired = self._apply_update('io', data, self._io_data)
+            self._publish_update('io')
+        self._notify_watchers(fired)
 
     def _update_task_object(self, data):
         with self.task_condition:
-            recurse_message(data, self._task_data)
+            fired = self._apply_update('task', data, self._task_data)
             self._update_running()
-            self.task_condition.notify()
+            self._publish_update('task')
+        self._notify_watchers(fired)
 
     def _update_interp_object(self, data):
         with self.interp_condition:
-            recurse_message(data, self._interp_data)
+            fired = self._apply_update('interp', data, self._interp_data)
             self._update_running()
-            self.interp_condition.notify()
+            self._publish_update('interp')
+        self._notify_watchers(fired)
+
+    # must be called with the condition of the channel held
+    def _apply_update(self, channel, data, obj):
+        changed = set()
+        fired = recurse_message(
+            data, obj, changed=changed, watches=self._watches[channel]
+        )
+        if changed:
+            version = self._versions[channel] + 1
+            self._versions[channel] = version
+            self._field_versions[channel].update(dict.fromkeys(changed, version))
+        self._snapshot_fields[channel].update(changed)
+        return [(list(node.callbacks), node.value(obj)) for node in fired]
+
+    @staticmethod
+    def _notify_watchers(fired):
+        for callbacks, value in fired:
+            for cb in callbacks:
+                cb(value)
+
+    # must be called with the condition of the channel held
+    def _publish_update(self, channel):
+        if self.coalesce_interval <= 0.0:
+            self._channel_conditions[channel].notify()
+            return
+
+        with self._publish_lock:
+            self._pending_channels.add(channel)
+            if self._publish_timer.active:
+                return  # merged into the pending publish
+            delay = self._last_publish + self.coalesce_interval - monotonic()
+            self._publish_timer.start(max(delay, 0.0))
+
+    def _publish_pending_channels(self):
+        with self._publish_lock:
+            channels = self._pending_channels
+            self._pending_channels = set()
+            self._last_publish = monotonic()
+        for channel in channels:
+            condition = self._channel_conditions[channel]
+            with condition:
+                condition.notify()
 
     def _update_running(self):
         running = (
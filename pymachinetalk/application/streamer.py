@@ -0,0 +1,281 @@
+# coding=utf-8
+import threading
+import time
+from collections import deque
+
+from .constants import JOG_STOP, JOG_CONTINUOUS
+from ..machinetalk_core.common.reactor import create_timer
+
+ZERO_TELEOP_VECTOR = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+
+class MdiStreamer(object):
+    """Streams MDI lines with a window of commands in flight.
+
+    A new line is sent whenever one of the in-flight lines has been
+    acknowledged as executed, so the task queue is never overrun.
+    """
+
+    def __init__(self, command, window=8, interpreter='execute'):
+        self.command = command
+        self.window = window
+        self.interpreter = interpreter
+        self.finished_condition = threading.Condition(threading.Lock())
+
+        # callbacks
+        self.on_finished = []
+
+        self.lines_sent = 0
+        self.lines_executed = 0
+        self.error = ''
+        self._lines = deque()
+        self._in_flight = 0
+        self._pumping = False
+        self._stopped = False
+        self._started = None
+        self._last_executed = None
+
+    @property
+    def pending(self):
+        """Number of lines that have not been executed yet."""
+        with self.finished_condition:
+            return len(self._lines) + self._in_flight
+
+    @property
+    def lines_per_second(self):
+        with self.finished_condition:
+            if self._started is None or self._last_executed is None:
+                return 0.0
+            elapsed = max(self._last_executed - self._started, 1e-9)
+            return self.lines_executed / elapsed
+
+    def put(self, line):
+        self.extend((line,))
+
+    def extend(self, lines):
+        with self.finished_condition:
+            self._lines.extend(lines)
+            self._stopped = False
+            self.error = ''
+            if self._started is None:
+                self._started = time.monotonic()
+        self._pump()
+
+    def stop(self):
+        """Drops all lines not sent yet, lines in flight are not aborted."""
+        with self.finished_condition:
+            self._lines.clear()
+            self._stopped = True
+            self.finished_condition.notify_all()
+
+    def wait_finished(self, timeout=None):
+        """Returns True once all lines are executed, False on timeout or error."""
+        with self.finished_condition:
+            self.finished_condition.wait_for(self._finished, timeout=timeout)
+            return not self.error and not self._lines and self._in_flight == 0
+
+    def _finished(self):
+        return self._stopped or (not self._lines and self._in_flight == 0)
+
+    def _pump(self):
+        with self.finished_condition:
+            if self._pumping:
+                return  # the running pump picks up the new credit
+            self._pumping = True
+
+        while True:
+            with self.finished_condition:
+                if (
+                    self._stopped
+                    or not self._lines
+                    or self._in_flight >= self.window
+                ):
+                    self._pumping = False
+                    return
+                line = self._lines.popleft()
+                self._in_flight += 1
+
+            ticket = self.command.execute_mdi(line, interpreter=self.interpreter)
+            if ticket is None:
+                self._abort(line, 'not connected')
+                return
+            self.lines_sent += 1
+            future = self.command.executed_future(ticket)
+            future.add_done_callback(self._line_executed)
+
+    def _abort(self, line, error):
+        with self.finished_condition:
+            self._lines.appendleft(line)
+            self._in_flight -= 1
+            self._pumping = False
+            self._stopped = True
+            self.error = error
+            self.finished_condition.notify_all()
+        for cb in self.on_finished:
+            cb(False)
+
+    def _line_executed(self, future):
+        with self.finished_condition:
+            self._in_flight -= 1
+            if future.cancelled():
+                # aborted or connection lost, the line might not be executed
+                notify = not self._stopped
+                self._stopped = True
+                if self.command.connected:
+                    self.error = 'aborted'
+                    self._lines.clear()  # never resume the aborted program
+                else:
+                    self.error = 'connection lost'
+            else:
+                self.lines_executed += 1
+                self._last_executed = time.monotonic()
+                notify = not self._lines and self._in_flight == 0
+            if notify:
+                self.finished_condition.notify_all()
+        if notify:
+            for cb in self.on_finished:
+                cb(not self.error)
+        else:
+            self._pump()
+
+
+class JogStreamer(object):
+    """Streams continuous jog and teleop setpoints at a fixed rate.
+
+    Only the latest setpoint per axis is kept and sent if it changed since
+    the last send. All motion is stopped when no setpoint was updated
+    within stall_timeout seconds and after a reconnect.
+    """
+
+    def __init__(self, command, rate=20.0, stall_timeout=0.5):
+        self.command = command
+        self.rate = rate
+        self.stall_timeout = stall_timeout
+        self._lock = threading.Lock()
+        self._timer = create_timer(self._tick)
+
+        self.commands_sent = 0
+        self._setpoints = {}  # axis -> latest velocity
+        self._sent = {}  # axis -> last sent velocity, only moving axes
+        self._teleop = None
+        self._teleop_sent = None
+        self._last_update = 0.0
+        self._stop_on_reconnect = ([], False)  # axes, teleop
+
+        command.on_connected_changed.append(self._connected_changed)
+
+    @property
+    def moving(self):
+        with self._lock:
+            return self._moving()
+
+    def _moving(self):
+        return bool(self._sent) or self._teleop_moving()
+
+    def _teleop_moving(self):
+        return self._teleop_sent not in (None, ZERO_TELEOP_VECTOR)
+
+    def jog(self, axis, velocity):
+        """Sets the velocity of a continuous jog, 0.0 stops the axis."""
+        with self._lock:
+            self._setpoints[axis] = velocity
+            self._setpoint_updated()
+
+    def teleop(self, a, b, c, u, v, w):
+        with self._lock:
+            self._teleop = (a, b, c, u, v, w)
+            self._setpoint_updated()
+
+    def stop(self):
+        """Stops all motion immediately."""
+        with self._lock:
+            for axis in self._setpoints:
+                self._setpoints[axis] = 0.0
+            if self._teleop is not None:
+                self._teleop = ZERO_TELEOP_VECTOR
+        self._send_setpoints()
+
+    def close(self):
+        self.stop()
+        self._timer.cancel()
+        if self._connected_changed in self.command.on_connected_changed:
+            self.command.on_connected_changed.remove(self._connected_changed)
+
+    # must be called with the lock held
+    def _setpoint_updated(self):
+        self._last_update = time.monotonic()
+        if not self._timer.active:
+            self._timer.start(0.0)  # first change is sent right away
+
+    def _tick(self):
+        with self._lock:
+            if time.monotonic() - self._last_update > self.stall_timeout:
+                # producer stalled, never keep moving on a stale setpoint
+                for axis in self._setpoints:
+                    self._setpoints[axis] = 0.0
+                if self._teleop is not None:
+                    self._teleop = ZERO_TELEOP_VECTOR
+        self._send_setpoints()
+        with self._lock:
+            if self._moving():
+                self._timer.start(1.0 / self.rate)
+
+    def _send_setpoints(self):
+        with self._lock:
+            jogs = [
+                (axis, velocity)
+                for axis, velocity in self._setpoints.items()
+                if velocity != self._sent.get(axis, 0.0)
+            ]
+            teleop = self._teleop
+            if teleop == self._teleop_sent:
+                teleop = None
+            # optimistically marked as sent, failed sends are reverted below
+            for axis, velocity in jogs:
+                self._update_sent(axis, velocity)
+            if teleop is not None:
+                self._teleop_sent = teleop
+
+        for axis, velocity in jogs:
+            if velocity == 0.0:
+                ticket = self.command.jog(JOG_STOP, axis)
+            else:
+                ticket = self.command.jog(JOG_CONTINUOUS, axis, velocity=velocity)
+            if ticket is None:
+                with self._lock:
+                    self._update_sent(axis, 0.0)  # disconnected, nothing moves
+            else:
+                self.commands_sent += 1
+        if teleop is not None:
+            if self.command.set_teleop_vector(*teleop) is None:
+                with self._lock:
+                    self._teleop_sent = None
+            else:
+                self.commands_sent += 1
+
+    # must be called with the lock held
+    def _update_sent(self, axis, velocity):
+        if velocity == 0.0:
+            self._sent.pop(axis, None)
+        else:
+            self._sent[axis] = velocity
+
+    def _connected_changed(self, connected):
+        if not connected:
+            with self._lock:
+                # the last setpoints might still be active on the machine
+                self._stop_on_reconnect = (list(self._sent), self._teleop_moving())
+                self._setpoints.clear()
+                self._sent.clear()
+                self._teleop = None
+                self._teleop_sent = None
+            self._timer.cancel()
+            return
+
+        with self._lock:
+            axes, teleop = self._stop_on_reconnect
+            self._stop_on_reconnect = ([], False)
+        for axis in axes:
+            self.command.jog(JOG_STOP, axis)
+        if teleop:
+            self.command.set_teleop_vector(*ZERO_TELEOP_VECTOR)
@@ -0,0 +1,167 @@
+# coding=utf-8
+import asyncio
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def command(reactor):
+    from pymachinetalk.application import ApplicationCommand
+
+    return ApplicationCommand()
+
+
+def reply(ticket):
+    from machinetalk.protobuf.message_pb2 import Container
+
+    return Container(reply_ticket=ticket)
+
+
+def test_executed_reply_resolves_all_older_tickets(command):
+    first = command.executed_future(1)
+    second = command.executed_future(2)
+    third = command.executed_future(3)
+
+    command.emccmd_executed_received(reply(2))
+
+    assert first.result(timeout=0) is True
+    assert second.result(timeout=0) is True
+    assert not third.done()
+    assert list(command._executed_futures) == [3]
+
+
+def test_future_of_already_completed_ticket_is_resolved(command):
+    command.emccmd_completed_received(reply(5))
+
+    assert command.completed_future(4).result(timeout=0) is True
+    assert command._completed_futures == {}
+
+
+def test_waiters_share_one_future_per_ticket(command):
+    assert command.executed_future(1) is command.executed_future(1)
+
+
+def test_wait_for_older_ticket_does_not_miss_reply(command):
+    thread = threading.Timer(0.05, command.emccmd_executed_received, [reply(3)])
+    thread.start()
+
+    assert command.wait_executed(ticket=1, timeout=1.0)
+    thread.join()
+
+
+def test_wait_completed_times_out(command):
+    assert not command.wait_completed(ticket=1, timeout=0.01)
+
+
+def test_disconnect_cancels_pending_futures(command):
+    future = command.completed_future(1)
+
+    command.clear_connected()
+
+    assert future.cancelled()
+    assert command._completed_futures == {}
+    assert not command.wait_completed(ticket=1, timeout=0.01)
+
+
+def test_async_timeout_keeps_future_for_other_waiters(command):
+    future = command.executed_future(1)
+    loop = asyncio.new_event_loop()
+
+    try:
+        result = loop.run_until_complete(
+            command.wait_executed_async(ticket=1, timeout=0.01)
+        )
+
+        assert result is False
+        assert not future.cancelled()
+        command.emccmd_executed_received(reply(1))
+        assert loop.run_until_complete(
+            command.wait_executed_async(ticket=1, timeout=1.0)
+        )
+    finally:
+        loop.close()
+
+
+def test_reply_skips_futures_cancelled_by_the_waiter(command):
+    future = command.executed_future(1)
+    callbacks = []
+    future.add_done_callback(callbacks.append)
+    future.cancel()
+
+    command.emccmd_executed_received(reply(1))
+
+    assert future.cancelled()
+    assert callbacks == [future]
+
+
+def test_concurrent_producers_get_unique_tickets_in_send_order(command, mocker):
+    sent = []
+
+    def send_command_message(msg_type, tx):
+        sent.append((tx.ticket, tx.emc_command_params.index, tx.interp_name))
+
+    mocker.patch.object(command, 'send_command_message', send_command_message)
+    command.connected = True
+
+    def produce(index):
+        for _ in range(200):
+            command.home_axis(index)
+
+    threads = [threading.Thread(target=produce, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    tickets = [ticket for ticket, _, _ in sent]
+    assert tickets == list(range(1, 801))
+    assert command.ticket == 800
+    for index in range(4):
+        assert sum(1 for _, i, _ in sent if i == index) == 200
+    assert all(interp_name == '' for _, _, interp_name in sent)
+
+
+def test_enabled_metrics_record_command_round_trip_latency(command, mocker):
+    mocker.patch.object(command._command_channel, 'send_socket_message')
+    command.connected = True
+    command.enable_metrics()
+
+    ticket = command.run_program(0)
+    command.emccmd_executed_received(reply(ticket))
+    command.emccmd_completed_received(reply(ticket))
+
+    latency = command.latency_metrics
+    assert latency.executed_ns['MT_EMC_TASK_PLAN_RUN'].count == 1
+    assert latency.completed_ns['MT_EMC_TASK_PLAN_RUN'].count == 1
+    assert 'command' in command.get_metrics()
+
+    command.disable_metrics()
+    assert command.latency_metrics is None
+
+
+def test_priority_reply_only_acknowledges_its_own_ticket(command, mocker):
+    from pymachinetalk.application import EMC_TASK_STATE_ESTOP
+
+    send = mocker.patch.object(command._command_channel, 'send_socket_message')
+    command.connected = True
+    queued = command.run_program(0)
+    estop = command.set_task_state(EMC_TASK_STATE_ESTOP)
+    assert send.call_args_list[-1][1] == {'priority': True}
+
+    later = command.run_program(0)
+    command.emccmd_executed_received(reply(estop))
+
+    assert command.wait_executed(ticket=estop, timeout=0)
+    assert command.executed_future(queued).cancelled()
+    assert not command.executed_future(later).done()
+    command.emccmd_executed_received(reply(later))
+    assert command.executed_future(later).done()
+    assert command.executed_ticket == later
+
+
+def test_ticket_never_decreases(command):
+    command._update_ticket(5)
+    command._update_ticket(3)  # a concurrent send finishing late
+
+    assert command.ticket == 5
@@ -0,0 +1,140 @@
+# coding=utf-8
+import time
+
+import pytest
+
+
+@pytest.fixture
+def status(reactor):
+    from pymachinetalk.application import ApplicationStatus
+
+    return ApplicationStatus()
+
+
+@pytest.fixture
+def motion():
+    from machinetalk.protobuf.message_pb2 import Container
+
+    return Container().emc_status_motion
+
+
+def test_updates_notify_immediately_by_default(status, motion, mocker):
+    notify = mocker.spy(status.motion_condition, 'notify')
+    motion.current_vel = 1.0
+
+    status._update_motion_object(motion)
+
+    assert notify.call_count == 1
+    assert status.motion.current_vel == 1.0
+
+
+def test_coalesced_updates_publish_latest_value_once(status, motion, mocker):
+    notify = mocker.spy(status.motion_condition, 'notify')
+    status.coalesce_interval = 0.05
+    status._last_publish = time.monotonic()  # next publish is delayed
+
+    for i in range(10):
+        motion.current_vel = float(i)
+        status._update_motion_object(motion)
+    assert notify.call_count == 0
+
+    time.sleep(0.2)
+    assert notify.call_count == 1
+    assert status.motion.current_vel == 9.0
+
+
+def test_take_dirty_fields_returns_changed_fields(status, motion):
+    status.take_dirty_fields('motion')
+    motion.current_vel = 1.0
+    motion.position.x = 2.0
+
+    status._update_motion_object(motion)
+
+    assert status.take_dirty_fields('motion') == {'current_vel', 'position'}
+    assert status.take_dirty_fields('motion') == set()
+
+
+def test_watch_calls_back_on_watched_field_only(status, motion):
+    values = []
+    status.watch('motion.position.x', values.append)
+
+    motion.position.y = 1.0
+    status._update_motion_object(motion)
+    motion.position.x = 2.0
+    status._update_motion_object(motion)
+
+    assert values == [2.0]
+
+
+def test_unwatch_removes_callback(status, motion):
+    values = []
+    status.watch('motion.current_vel', values.append)
+    status.unwatch('motion.current_vel', values.append)
+
+    motion.current_vel = 1.0
+    status._update_motion_object(motion)
+
+    assert values == []
+    assert status._watches['motion'].children == {}
+
+
+def test_watch_rejects_unknown_fields(status):
+    with pytest.raises(ValueError):
+        status.watch('motion.position.foo', print)
+    with pytest.raises(ValueError):
+        status.watch('spindle.speed', print)
+
+
+def test_snapshot_is_not_affected_by_later_updates(status, motion):
+    motion.position.x = 1.0
+    status._update_motion_object(motion)
+
+    snapshot = status.snapshot()
+    motion.position.x = 2.0
+    status._update_motion_object(motion)
+
+    assert snapshot.motion.position.x == 1.0
+    assert status.snapshot().motion.position.x == 2.0
+
+
+def test_snapshot_shares_unchanged_fields(status, motion):
+    first = status.snapshot()
+    motion.current_vel = 1.0
+    status._update_motion_object(motion)
+
+    second = status.snapshot()
+
+    assert second.config is first.config
+    assert second.motion is not first.motion
+    assert second.motion.position is first.motion.position
+    assert second.motion.current_vel == 1.0
+
+
+def test_metrics_are_queryable_per_channel(status):
+    assert status.get_metrics() == {}
+
+    status.enable_metrics()
+
+    assert list(status.get_metrics()) == ['status']
+    status.disable_metrics()
+    assert status.get_metrics() == {}
+
+
+def test_changed_fields_are_tracked_per_consumer(status, motion):
+    first, _ = status.changed_fields('motion')
+    second, _ = status.changed_fields('motion')
+    motion.current_vel = 1.0
+    status._update_motion_object(motion)
+
+    first, fields = status.changed_fields('motion', since=first)
+    assert fields == {'current_vel'}
+    motion.Clear()
+    motion.position.x = 2.0
+    status._update_motion_object(motion)
+
+    second, fields = status.changed_fields('motion', since=second)
+    assert fields == {'current_vel', 'position'}
+    _, fields = status.changed_fields('motion', since=first)
+    assert fields == {'position'}
+    _, fields = status.changed_fields('motion', since=second)
+    assert fields == set()
@@ -0,0 +1,168 @@
+# coding=utf-8
+import pytest
+
+
+@pytest.fixture
+def command(reactor, mocker):
+    from pymachinetalk.application import ApplicationCommand
+
+    command = ApplicationCommand()
+    command.sent = []
+    command.messages = []
+
+    def send_command_message(msg_type, tx, priority=False):
+        command.sent.append((tx.ticket, tx.emc_command_params.command))
+        command.messages.append((msg_type, tx.emc_command_params))
+
+    mocker.patch.object(command, 'send_command_message', send_command_message)
+    command.connected = True
+    return command
+
+
+def executed(command, ticket):
+    from machinetalk.protobuf.message_pb2 import Container
+
+    command.emccmd_executed_received(Container(reply_ticket=ticket))
+
+
+def test_streamer_keeps_window_of_lines_in_flight(command):
+    from pymachinetalk.application import MdiStreamer
+
+    streamer = MdiStreamer(command, window=3)
+    streamer.extend('G0 X%d' % i for i in range(10))
+
+    assert command.sent == [(1, 'G0 X0'), (2, 'G0 X1'), (3, 'G0 X2')]
+
+    executed(command, 1)
+    assert len(command.sent) == 4
+    executed(command, 3)
+    assert len(command.sent) == 6
+    assert streamer.pending == 7
+
+
+def test_streamer_finishes_when_all_lines_are_executed(command):
+    from pymachinetalk.application import MdiStreamer
+
+    streamer = MdiStreamer(command, window=4)
+    finished = []
+    streamer.on_finished.append(finished.append)
+    streamer.extend('M%d' % i for i in range(10))
+
+    while command.sent[-1][0] < 10:
+        executed(command, command.sent[-1][0])
+    executed(command, 10)
+
+    assert [line for _, line in command.sent] == ['M%d' % i for i in range(10)]
+    assert streamer.wait_finished(timeout=0)
+    assert streamer.lines_executed == 10
+    assert streamer.lines_per_second > 0.0
+    assert finished == [True]
+
+
+def test_streamer_stops_on_connection_loss(command):
+    from pymachinetalk.application import MdiStreamer
+
+    streamer = MdiStreamer(command, window=2)
+    streamer.extend(['G0 X1', 'G0 X2', 'G0 X3'])
+
+    command.clear_connected()
+
+    assert not streamer.wait_finished(timeout=0)
+    assert streamer.error == 'connection lost'
+    assert streamer.pending == 1
+    assert len(command.sent) == 2
+
+
+def test_streamer_stops_on_abort(command):
+    from pymachinetalk.application import MdiStreamer
+
+    streamer = MdiStreamer(command, window=2)
+    streamer.extend(['G0 X1', 'G0 X2', 'G0 X3'])
+
+    command.abort()
+
+    assert not streamer.wait_finished(timeout=0)
+    assert streamer.error == 'aborted'
+    assert streamer.pending == 0
+    assert len(command.sent) == 3  # two lines and the abort
+
+
+@pytest.fixture
+def jog_streamer(command, mocker):
+    from pymachinetalk.application import JogStreamer
+
+    streamer = JogStreamer(command, rate=50.0)
+    streamer._timer.cancel()
+    streamer._timer = mocker.Mock(active=False)  # ticks are driven by the tests
+    return streamer
+
+
+def jogs(command):
+    from machinetalk.protobuf.types_pb2 import MT_EMC_AXIS_ABORT, MT_EMC_AXIS_JOG
+
+    names = {MT_EMC_AXIS_ABORT: 'stop', MT_EMC_AXIS_JOG: 'jog'}
+    result = [
+        (names[msg_type], params.index, params.velocity)
+        for msg_type, params in command.messages
+        if msg_type in names
+    ]
+    del command.messages[:]
+    return result
+
+
+def test_jog_streamer_sends_latest_setpoint_per_axis(command, jog_streamer):
+    jog_streamer.jog(0, 1.0)
+    jog_streamer.jog(0, 2.0)
+    jog_streamer.jog(1, -3.0)
+    jog_streamer._tick()
+
+    assert jogs(command) == [('jog', 0, 2.0), ('jog', 1, -3.0)]
+    assert jog_streamer._timer.start.call_args[0] == (1.0 / 50.0,)
+
+    jog_streamer._tick()
+    assert jogs(command) == []
+
+    jog_streamer.jog(1, 0.0)
+    jog_streamer._tick()
+    assert jogs(command) == [('stop', 1, 0.0)]
+
+
+def test_jog_streamer_coalesces_teleop_vector(command, jog_streamer):
+    from machinetalk.protobuf.types_pb2 import MT_EMC_TRAJ_SET_TELEOP_VECTOR
+
+    jog_streamer.teleop(1.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+    jog_streamer.teleop(0.5, 0.5, 0.0, 0.0, 0.0, 0.0)
+    jog_streamer._tick()
+
+    vectors = [
+        (params.pose.a, params.pose.b)
+        for msg_type, params in command.messages
+        if msg_type == MT_EMC_TRAJ_SET_TELEOP_VECTOR
+    ]
+    assert vectors == [(0.5, 0.5)]
+    assert jog_streamer.moving
+
+
+def test_jog_streamer_stops_on_stall(command, jog_streamer):
+    jog_streamer.jog(2, 1.0)
+    jog_streamer._tick()
+    jogs(command)
+
+    jog_streamer._last_update -= 1.0  # producer did not update in time
+    jog_streamer._tick()
+
+    assert jogs(command) == [('stop', 2, 0.0)]
+    assert not jog_streamer.moving
+
+
+def test_jog_streamer_stops_moving_axes_after_reconnect(command, jog_streamer):
+    jog_streamer.jog(0, 1.0)
+    jog_streamer._tick()
+    jogs(command)
+
+    command.clear_connected()
+    assert jogs(command) == []
+    command.set_connected()
+
+    assert jogs(command) == [('stop', 0, 0.0)]
+    assert not jog_streamer.moving
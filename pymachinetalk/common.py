@@ -1,8 +1,26 @@
 # coding=utf-8
+import asyncio
+import copy
 import sys
+import threading
 
+from .machinetalk_core.common.metrics import ChannelMetrics
 
-class MessageObject(object):
+
+class MessageObjectBase(object):
+    __slots__ = ()
+    is_position = False
+    id_map = {}
+
+    def __getitem__(self, index):
+        if self.is_position:
+            mapping = ['x', 'y', 'z', 'a', 'b', 'c', 'u', 'v', 'w']
+            return getattr(self, mapping[index])
+        else:
+            raise RuntimeError("Object does not support indexed access")
+
+
+class MessageObject(MessageObjectBase):
     def __init__(self):
         self.is_position = False
         self.id_map = {}
@@ -13,12 +31,107 @@ class MessageObject(object):
             output += '%s: %s\n' % (attr, getattr(self, attr))
         return output
 
-    def __getitem__(self, index):
-        if self.is_position:
-            mapping = ['x', 'y', 'z', 'a', 'b', 'c', 'u', 'v', 'w']
-            return getattr(self, mapping[index])
-        else:
-            raise RuntimeError("Object does not support indexed access")
+
+class SlotsMessageObject(MessageObjectBase):
+    """Base of the classes generated by message_class."""
+
+    __slots__ = ()
+    _field_defaults = ()  # (name, value, factory) per field
+
+    def __init__(self):
+        for name, value, factory in self._field_defaults:
+            setattr(self, name, value if factory is None else factory())
+
+    def __str__(self):
+        output = ''
+        for attr in self.__slots__:
+            output += '%s: %s\n' % (attr, getattr(self, attr))
+        return output
+
+
+_message_classes = {}
+_message_classes_lock = threading.RLock()
+
+
+def message_class(descriptor):
+    """Returns a compact object class for the given protobuf message type.
+
+    Instances store the fields in __slots__ and share the id map of their
+    class, attribute access is the same as for MessageObject instances
+    initialized with recurse_descriptor.
+    """
+    cls = _message_classes.get(descriptor)
+    if cls is None:
+        with _message_classes_lock:
+            cls = _message_classes.get(descriptor)
+            if cls is None:
+                cls = _create_message_class(descriptor)
+                _message_classes[descriptor] = cls
+    return cls
+
+
+def _create_message_class(descriptor):
+    defaults = []
+    for field in descriptor.fields:
+        value = _default_value(field)
+        factory = None
+        repeated = field.label == field.LABEL_REPEATED
+        if field.type == field.TYPE_MESSAGE:
+            sub_fields = field.message_type.fields
+            if repeated and len(sub_fields) == 2:  # plain list of values
+                value = [_default_value(f) for f in sub_fields if f.name != 'index'][0]
+            else:
+                factory = message_class(field.message_type)
+        if repeated:
+            factory = _list_factory(value, factory)
+        defaults.append((field.name, value, factory))
+
+    namespace = {
+        '__slots__': tuple(field.name for field in descriptor.fields),
+        '_field_defaults': tuple(defaults),
+        'id_map': {field.number: field.name for field in descriptor.fields},
+        'is_position': descriptor.name == 'Position',
+    }
+    return type(str(descriptor.name), (SlotsMessageObject,), namespace)
+
+
+def _list_factory(value, factory):
+    if factory is None:
+        return lambda: [value]
+    return lambda: [factory()]
+
+
+def _default_value(field):
+    if field.type == field.TYPE_BOOL:
+        return False
+    elif field.type in (field.TYPE_DOUBLE, field.TYPE_FLOAT):
+        return 0.0
+    elif field.type in (
+        field.TYPE_INT32,
+        field.TYPE_INT64,
+        field.TYPE_UINT32,
+        field.TYPE_UINT64,
+        field.TYPE_ENUM,
+    ):
+        return 0
+    elif field.type == field.TYPE_STRING:
+        return ''
+    return None
+
+
+def snapshot_object(obj, fields, previous=None):
+    """Returns a point-in-time copy of a message_class object.
+
+    Only the given top-level fields are copied from obj, all other fields
+    are shared with the previous snapshot of the same object.
+    """
+    source = obj if previous is None else previous
+    snapshot = object.__new__(type(obj))
+    for name in obj.__slots__:
+        setattr(snapshot, name, getattr(source, name))
+    for name in fields:
+        setattr(snapshot, name, copy.deepcopy(getattr(obj, name)))
+    return snapshot
 
 
 def recurse_descriptor(descriptor, obj):
@@ -58,47 +171,228 @@ def recurse_descriptor(descriptor, obj):
         obj.id_map[field.number] = field.name
 
 
-def recurse_message(message, obj, field_filter=''):
-    for descriptor in message.DESCRIPTOR.fields:
-        filter_enabled = field_filter != ''
+def recurse_message(message, obj, field_filter='', changed=None, watches=None):
+    """Applies the fields present in message to obj.
+
+    If a set is passed as changed, the names of the updated top-level
+    fields are added to it. If a FieldWatch tree is passed as watches,
+    the list of watched nodes touched by the update is returned.
+    """
+    handlers = _get_field_handlers(message.DESCRIPTOR)
+    if field_filter != '':
         # TODO: handle special file case here...
+        for descriptor, value in message.ListFields():
+            if descriptor.name == field_filter:
+                handlers[descriptor.number](obj, value)
+                if changed is not None:
+                    changed.add(descriptor.name)
+    elif changed is not None:
+        for descriptor, value in message.ListFields():
+            handler = handlers.get(descriptor.number)
+            if handler is not None:
+                handler(obj, value)
+                changed.add(descriptor.name)
+    else:
+        _update_object(message, obj, handlers)
+
+    if watches is not None:
+        fired = []
+        if watches.children:
+            _collect_watches(message, watches, fired)
+        return fired
+
+
+def _update_object(message, obj, handlers):
+    # ListFields only yields the fields present in the message
+    for descriptor, value in message.ListFields():
+        handler = handlers.get(descriptor.number)
+        if handler is not None:
+            handler(obj, value)
 
-        if descriptor.number in obj.id_map:
-            name = obj.id_map[descriptor.number]
+
+# field number -> update function, compiled once per message type
+_field_handlers = {}
+_field_handlers_lock = threading.RLock()
+
+
+def _get_field_handlers(descriptor):
+    handlers = _field_handlers.get(descriptor)
+    if handlers is None:
+        with _field_handlers_lock:
+            handlers = _field_handlers.get(descriptor)
+            if handlers is None:
+                handlers = _compile_field_handlers(descriptor)
+    return handlers
+
+
+def _compile_field_handlers(descriptor):
+    handlers = {}
+    _field_handlers[descriptor] = handlers  # early to support recursive types
+    for field in descriptor.fields:
+        if field.label == field.LABEL_REPEATED:
+            if field.type != field.TYPE_MESSAGE:
+                continue  # repeated scalars are not part of the objects
+            handler = _repeated_message_handler(field.name, field.message_type)
+        elif field.type == field.TYPE_MESSAGE:
+            handler = _message_handler(field.name, field.message_type)
         else:
-            continue  # we do not know the object
+            handler = _scalar_handler(field.name)
+        handlers[field.number] = handler
+    return handlers
+
+
+def _scalar_handler(name):
+    def update(obj, value):
+        setattr(obj, name, value)
+
+    return update
+
+
+def _message_handler(name, descriptor):
+    handlers = _get_field_handlers(descriptor)
+
+    def update(obj, message):
+        _update_object(message, getattr(obj, name), handlers)
+
+    return update
+
+
+def _repeated_message_handler(name, descriptor):
+    if len(descriptor.fields) == 2:  # index and value are stored as plain list
+        value_field = [f for f in descriptor.fields if f.name != 'index'][0]
+        value_name = value_field.name
+        default = value_field.default_value
+
+        def update_values(obj, repeated):
+            array = getattr(obj, name)
+            for sub_message in repeated:
+                index = sub_message.index
+                while len(array) < (index + 1):
+                    array.append(default)
+                array[index] = getattr(sub_message, value_name)
+
+        return update_values
+
+    handlers = _get_field_handlers(descriptor)
+    element_class = message_class(descriptor)
+
+    def update_objects(obj, repeated):
+        array = getattr(obj, name)
+        for sub_message in repeated:
+            index = sub_message.index
+            while len(array) < (index + 1):
+                array.append(element_class())
+            _update_object(sub_message, array[index], handlers)
+
+    return update_objects
 
-        if filter_enabled and name != field_filter:
-            continue
 
-        if descriptor.label != descriptor.LABEL_REPEATED:
-            if message.HasField(name):
-                if descriptor.type == descriptor.TYPE_MESSAGE:
-                    sub_obj = getattr(obj, name)
-                    recurse_message(getattr(message, name), sub_obj)
-                else:
-                    setattr(obj, name, getattr(message, name))
+class FieldWatch(object):
+    """Tree of field watchers indexed by protobuf field number.
+
+    Only the branches of an update message leading to a watched field
+    are visited, all other fields are skipped.
+    """
+
+    __slots__ = ('names', 'children', 'callbacks')
+
+    def __init__(self, names=()):
+        self.names = names  # attribute path from the root object
+        self.children = {}  # field number -> FieldWatch
+        self.callbacks = []
+
+    def add(self, descriptor, path, callback):
+        node = self
+        for field in resolve_field_path(descriptor, path):
+            child = node.children.get(field.number)
+            if child is None:
+                child = FieldWatch(node.names + (field.name,))
+                node.children[field.number] = child
+            node = child
+        node.callbacks.append(callback)
+
+    def remove(self, descriptor, path, callback):
+        fields = resolve_field_path(descriptor, path)
+        nodes = [self]
+        for field in fields:
+            node = nodes[-1].children.get(field.number)
+            if node is None:
+                raise ValueError('%s is not watched' % path)
+            nodes.append(node)
+        nodes[-1].callbacks.remove(callback)
+        # prune branches without watchers
+        for i in reversed(range(len(fields))):
+            node = nodes[i + 1]
+            if node.callbacks or node.children:
+                break
+            del nodes[i].children[fields[i].number]
+
+    def value(self, obj):
+        for name in self.names:
+            obj = getattr(obj, name)
+        return obj
+
+
+def resolve_field_path(descriptor, path):
+    """Resolves a dotted field path like 'position.x' to field descriptors."""
+    fields = []
+    names = path.split('.')
+    for i, name in enumerate(names):
+        if descriptor is None:
+            raise ValueError('%s: %s has no fields' % (path, names[i - 1]))
+        field = descriptor.fields_by_name.get(name)
+        if field is None:
+            raise ValueError('%s: unknown field %s' % (path, name))
+        fields.append(field)
+        if field.label == field.LABEL_REPEATED or field.type != field.TYPE_MESSAGE:
+            descriptor = None  # only whole repeated fields can be watched
         else:
-            if descriptor.type == descriptor.TYPE_MESSAGE:
-                array = getattr(obj, name)
-                repeated = getattr(message, name)
-                for sub_message in repeated:
-                    index = sub_message.index
-
-                    while len(array) < (index + 1):
-                        array.append(MessageObject())
-
-                    if len(sub_message.DESCRIPTOR.fields) == 2:
-                        sub_obj = MessageObject()
-                        recurse_descriptor(sub_message.DESCRIPTOR, sub_obj)
-                        recurse_message(sub_message, sub_obj)
-                        delattr(sub_obj, 'index')
-                        value = getattr(sub_obj, dir(sub_obj)[-1])
-                    else:
-                        sub_obj = array[index]
-                        recurse_message(sub_message, sub_obj)
-                        value = sub_obj
-                    array[index] = value
+            descriptor = field.message_type
+    return fields
+
+
+def _collect_watches(message, node, fired):
+    children = node.children
+    for descriptor, value in message.ListFields():
+        child = children.get(descriptor.number)
+        if child is None:
+            continue
+        if child.callbacks:
+            fired.append(child)
+        if child.children:
+            _collect_watches(value, child, fired)
+
+
+async def wait_for_callback(callbacks, predicate, timeout=None):
+    """Awaitable counterpart of the condition based wait_* methods.
+
+    Evaluates predicate whenever one of the callbacks in the given
+    callback list fires, from whichever thread that happens, and resolves
+    once it holds. Returns the final value of predicate.
+    """
+    if predicate():
+        return True
+
+    loop = asyncio.get_event_loop()
+    future = loop.create_future()
+
+    def resolve():
+        if not future.done():
+            future.set_result(True)
+
+    def changed(*_):
+        if predicate():
+            loop.call_soon_threadsafe(resolve)
+
+    callbacks.append(changed)
+    try:
+        if not predicate():  # might have changed before registering
+            await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        callbacks.remove(changed)
+    return predicate()
 
 
 # noinspection PyUnresolvedReferences
@@ -128,3 +422,26 @@ class ComponentBase(object):
 
     def _on_error_string_changed(self, string):
         sys.stderr.write('Error: %s\n' % string)
+
+    def _metrics_channels(self):
+        for attr, channel in vars(self).items():
+            if attr.endswith('_channel') and hasattr(channel, 'metrics'):
+                yield attr.strip('_')[: -len('_channel')], channel
+
+    def enable_metrics(self):
+        """Starts recording metrics on all channels of the component."""
+        for _, channel in self._metrics_channels():
+            if channel.metrics is None:
+                channel.metrics = ChannelMetrics()
+
+    def disable_metrics(self):
+        for _, channel in self._metrics_channels():
+            channel.metrics = None
+
+    def get_metrics(self):
+        """Returns the ChannelMetrics of each channel by channel name."""
+        return {
+            name: channel.metrics
+            for name, channel in self._metrics_channels()
+            if channel.metrics is not None
+        }
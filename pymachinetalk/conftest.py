@@ -0,0 +1,25 @@
+# coding=utf-8
+import pytest
+
+
+@pytest.fixture
+def reactor():
+    """Shared reactor for all channels created during the test."""
+    from pymachinetalk.machinetalk_core.common import reactor as reactor_module
+
+    reactor = reactor_module.Reactor()
+    reactor_module.set_default_reactor(reactor)
+    yield reactor
+    reactor_module.set_default_reactor(None)
+    reactor.stop()
+
+
+@pytest.fixture(params=['reactor', 'thread'])
+def channel_mode(request):
+    """Runs a test with the shared reactor and with a socket worker per channel.
+
+    Channels created without a reactor must be closed by the test.
+    """
+    if request.param == 'reactor':
+        request.getfixturevalue('reactor')
+    return request.param
@@ -1,10 +1,14 @@
 # coding=utf-8
 import threading
+from array import array
+from collections import deque
+from contextlib import contextmanager
 
 from .dns_sd import ServiceContainer, Service
-from .common import ComponentBase
+from .common import ComponentBase, wait_for_callback
 
 # protobuf
+import machinetalk.protobuf.types_pb2 as pb
 from machinetalk.protobuf.message_pb2 import Container
 
 # noinspection PyUnresolvedReferences
@@ -18,15 +22,83 @@ from machinetalk.protobuf.types_pb2 import (
     HAL_OUT,
 )
 from .machinetalk_core.halremote.remotecomponentbase import RemoteComponentBase
+from .machinetalk_core.halremote.halrcompsubscribe import HalrcompSubscribe
+from .machinetalk_core.common.rpcclient import RpcClient
+from .machinetalk_core.common.reactor import create_timer
+
+
+class PinStore(object):
+    """Compact storage of pin values, one typed array per HAL type.
+
+    Each pin occupies a slot in the array of its type, in the order the
+    pins have been added.
+    """
+
+    _typecodes = {HAL_FLOAT: 'd', HAL_BIT: 'B', HAL_S32: 'i', HAL_U32: 'I'}
+    _converters = {
+        HAL_FLOAT: float,
+        HAL_BIT: lambda value: int(bool(value)),
+        HAL_S32: int,
+        HAL_U32: int,
+    }
+
+    def __init__(self):
+        self._arrays = {}
+        self._names = {}
+        for pintype, typecode in self._typecodes.items():
+            self._arrays[pintype] = array(typecode)
+            self._names[pintype] = []
+
+    def add(self, name, pintype, value):
+        """Adds a slot and returns its index.
+
+        Raises BufferError while a view of the array is alive.
+        """
+        values = self._arrays[pintype]
+        values.append(self._converters[pintype](value))
+        self._names[pintype].append(name)
+        return len(values) - 1
+
+    def get(self, pintype, index):
+        value = self._arrays[pintype][index]
+        if pintype == HAL_BIT:
+            return bool(value)
+        return value
+
+    def set(self, pintype, index, value):
+        self._arrays[pintype][index] = self._converters[pintype](value)
+
+    def values(self, pintype):
+        """Returns the array holding the values of all pins of a type."""
+        return self._arrays[pintype]
+
+    def names(self, pintype):
+        """Returns the pin names in the order of the values array."""
+        return self._names[pintype]
+
+    def float_view(self):
+        """Returns a NumPy view of all float pin values, requires numpy.
+
+        The view shares memory with the store, no pins can be added while
+        it is alive.
+        """
+        import numpy
+
+        return numpy.frombuffer(self._arrays[HAL_FLOAT], dtype=numpy.float64)
 
 
 class Pin(object):
     def __init__(self):
         self.name = ''
+        self.remote_name = ''  # component name prefixed name
         self.pintype = HAL_BIT
         self.direction = HAL_IN
         self._synced = False
         self._value = None
+        self._store = None  # value is kept in the store once attached
+        self._index = 0
+        self._value_waiters = 0
+        self._synced_waiters = 0
         self.handle = 0  # stores handle received on bind
         self.parent = None
         self.synced_condition = threading.Condition(threading.Lock())
@@ -36,34 +108,77 @@ class Pin(object):
         self.on_synced_changed = []
         self.on_value_changed = []
 
+    # waiters register before checking, the unlocked _update either sees
+    # the registration or has updated the value before the check
     def wait_synced(self, timeout=None):
         with self.synced_condition:
-            if self.synced:
-                return True
-            self.synced_condition.wait(timeout=timeout)
-            return self.synced
+            self._synced_waiters += 1
+            try:
+                if self._synced:
+                    return True
+                self.synced_condition.wait(timeout=timeout)
+            finally:
+                self._synced_waiters -= 1
+            return self._synced
 
     def wait_value(self, timeout=None):
         with self.value_condition:
-            if self.value:
-                return True
-            self.value_condition.wait(timeout=timeout)
-            return self.value
+            self._value_waiters += 1
+            try:
+                if self._get_value():
+                    return True
+                self.value_condition.wait(timeout=timeout)
+            finally:
+                self._value_waiters -= 1
+            return self._get_value()
 
     @property
     def value(self):
         with self.value_condition:
-            return self._value
+            return self._get_value()
 
     @value.setter
     def value(self, value):
         with self.value_condition:
-            if self._value != value:
-                self._value = value
+            if self._get_value() != value:
+                self._set_value(value)
                 self.value_condition.notify()
                 for func in self.on_value_changed:
                     func(value)
 
+    def _get_value(self):
+        if self._store is None:
+            return self._value
+        return self._store.get(self.pintype, self._index)
+
+    def _set_value(self, value):
+        if self._store is None:
+            self._value = value
+        else:
+            self._store.set(self.pintype, self._index, value)
+
+    def _update(self, value):
+        # value received from the remote component
+        if self.on_value_changed or self.on_synced_changed:
+            self.value = value
+            self.synced = True
+            return
+
+        # nobody is watching, skip locking unless a wait is in progress
+        self._set_value(value)
+        self._synced = True
+        if self._value_waiters:
+            with self.value_condition:
+                self.value_condition.notify_all()
+        if self._synced_waiters:
+            with self.synced_condition:
+                self.synced_condition.notify_all()
+
+    def _attach(self, store):
+        self._index = store.add(self.name, self.pintype, self._value)
+        self._store = store
+        self._value = None
+
     @property
     def synced(self):
         with self.synced_condition:
@@ -89,6 +204,15 @@ class Pin(object):
         return self.value
 
 
+# pin type -> (value field of the Pin message, converter)
+_pin_decoders = {
+    HAL_FLOAT: ('halfloat', float),
+    HAL_BIT: ('halbit', bool),
+    HAL_S32: ('hals32', int),
+    HAL_U32: ('halu32', int),
+}
+
+
 class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
     def __init__(self, name, debug=False):
         RemoteComponentBase.__init__(self, debuglevel=int(debug))
@@ -103,13 +227,20 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
         self.name = name
         self.pinsbyname = {}
         self.pinsbyhandle = {}
+        self.store = PinStore()
+        self._pin_decoders = {}  # handle -> (pin, value field, converter)
+        self._pins_by_remote_name = None  # full remote name -> pin, built on bind
         self.no_create = False
         self.no_bind = False
 
         self.connected = False
 
-        # more efficient to reuse a protobuf message
-        self._tx = Container()
+        # batched pin changes, when set changes are sent at most once per interval
+        self.auto_flush_interval = 0.0
+        self._pending_pins = {}  # handle -> pin, latest value is sent on flush
+        self._pending_lock = threading.Lock()
+        self._batch_depth = 0
+        self._flush_timer = create_timer(self.flush)
 
         self._halrcomp_service = Service(type_='halrcomp')
         self._halrcmd_service = Service(type_='halrcmd')
@@ -129,6 +260,11 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
             self.connected_condition.wait(timeout=timeout)
             return self.connected
 
+    async def wait_connected_async(self, timeout=None):
+        return await wait_for_callback(
+            self.on_connected_changed, lambda: self.connected, timeout
+        )
+
     def set_connected(self):
         with self.connected_condition:
             self.connected = True
@@ -156,25 +292,37 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
                 self.connected_condition.notify()
                 changed = True
         if changed:
+            with self._pending_lock:
+                self._pending_pins.clear()  # all values are sent again on bind
             for cb in self.on_connected_changed:
                 cb(self.connected)
 
     def halrcomp_incremental_update_received(self, _, rx):
+        decoders = self._pin_decoders
         for rpin in rx.pin:
-            lpin = self.pinsbyhandle[rpin.handle]
-            self.pin_update(rpin, lpin)
+            decoder = decoders.get(rpin.handle)
+            if decoder is None:
+                self.pin_update(rpin, self.pinsbyhandle[rpin.handle])
+                continue
+            lpin, field, convert = decoder
+            lpin._update(convert(getattr(rpin, field)))
 
     def halrcomp_full_update_received(self, _, rx):
         if len(rx.comp) == 0:  # empty message
             return
 
         comp = rx.comp[0]
+        decoders = self._pin_decoders
         for rpin in comp.pin:
-            name = '.'.join(rpin.name.split('.')[1:])
-            lpin = self.pinsbyname[name]
-            lpin.handle = rpin.handle
-            self.pinsbyhandle[rpin.handle] = lpin
-            self.pin_update(rpin, lpin)
+            decoder = decoders.get(rpin.handle)
+            if decoder is None or decoder[0].remote_name != rpin.name:
+                lpin = self._remote_pin_index()[rpin.name]
+                lpin.handle = rpin.handle
+                self.pinsbyhandle[rpin.handle] = lpin
+                decoder = (lpin,) + _pin_decoders[lpin.pintype]
+                decoders[rpin.handle] = decoder
+            lpin, field, convert = decoder
+            lpin._update(convert(getattr(rpin, field)))
 
         self.pins_synced()  # accept that pins have been synced
 
@@ -188,7 +336,9 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
         pin.pintype = pintype
         pin.direction = direction
         pin.parent = self
+        pin.remote_name = '%s.%s' % (self.name, name)
         self.pinsbyname[name] = pin
+        self._pins_by_remote_name = None
 
         if pintype == HAL_FLOAT:
             pin.value = 0.0
@@ -196,15 +346,35 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
             pin.value = False
         elif pintype in (HAL_S32, HAL_U32):
             pin.value = 0
+        pin._attach(self.store)
         return pin
 
     def unsync_pins(self):
         for name in self.pinsbyname:
             self.pinsbyname[name].synced = False
 
+    def _remote_pin_index(self):
+        if self._pins_by_remote_name is None:
+            self._pins_by_remote_name = {
+                pin.remote_name: pin for pin in self.pinsbyname.values()
+            }
+        return self._pins_by_remote_name
+
     def getpin(self, name):
         return self.pinsbyname[name]
 
+    def get_many(self, names):
+        """Returns the values of the pins with the given names."""
+        pins = self.pinsbyname
+        return [pins[name].get() for name in names]
+
+    def set_many(self, mapping):
+        """Sets pin values from a name to value mapping in a single batch."""
+        pins = self.pinsbyname
+        with self.batch():
+            for name, value in mapping.items():
+                pins[name].set(value)
+
     @staticmethod
     def pin_update(rpin, lpin):
         if rpin.HasField('halfloat'):
@@ -221,14 +391,50 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
             lpin.synced = True
 
     def pin_change(self, pin):
-        if self.debug:
-            print('[%s] pin change %s' % (self.name, pin.name))
+        if self.tracer is not None:
+            self.tracer(self.name, 'event', 'pin change %s' % pin.name)
 
         if not self.connected:  # accept only when connected
             return
         if pin.direction == HAL_IN:  # only update out and IO pins
             return
 
+        with self._pending_lock:
+            if self._batch_depth > 0 or self.auto_flush_interval > 0.0:
+                self._pending_pins[pin.handle] = pin
+                if self._batch_depth == 0 and not self._flush_timer.active:
+                    self._flush_timer.start(self.auto_flush_interval)
+                return
+
+        self._send_pins((pin,))
+
+    @contextmanager
+    def batch(self):
+        """Collects all pin changes in the block into a single message.
+
+        Repeated changes of the same pin are only sent once, with the
+        latest value. Batches can be nested.
+        """
+        with self._pending_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._pending_lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
+
+    def flush(self):
+        """Sends all pending pin changes."""
+        with self._pending_lock:
+            pins = list(self._pending_pins.values())
+            self._pending_pins.clear()
+        if pins and self.connected:
+            self._send_pins(pins)
+
+    def _send_pins(self, pins):
         # This message MUST carry a Pin message for each pin which has
         # changed value since the last message of this type.
         # Each Pin message MUST carry the handle field.
@@ -236,26 +442,30 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
         # Each Pin message MUST carry the type field
         # Each Pin message MUST - depending on pin type - carry a halbit,
         # halfloat, hals32, or halu32 field.
-        p = self._tx.pin.add()
-        p.handle = pin.handle
-        p.type = pin.pintype
-        if p.type == HAL_FLOAT:
-            p.halfloat = float(pin.value)
-        elif p.type == HAL_BIT:
-            p.halbit = bool(pin.value)
-        elif p.type == HAL_S32:
-            p.hals32 = int(pin.value)
-        elif p.type == HAL_U32:
-            p.halu32 = int(pin.value)
-        self.send_halrcomp_set(self._tx)
+        # sent from user and timer threads, a shared message would mix pins
+        tx = Container()
+        for pin in pins:
+            p = tx.pin.add()
+            p.handle = pin.handle
+            p.type = pin.pintype
+            if p.type == HAL_FLOAT:
+                p.halfloat = float(pin.value)
+            elif p.type == HAL_BIT:
+                p.halbit = bool(pin.value)
+            elif p.type == HAL_S32:
+                p.hals32 = int(pin.value)
+            elif p.type == HAL_U32:
+                p.halu32 = int(pin.value)
+        self.send_halrcomp_set(tx)
 
     def bind_component(self):
-        c = self._tx.comp.add()
+        tx = Container()
+        c = tx.comp.add()
         c.name = self.name
         c.no_create = self.no_create  # for now we create the component
-        for name, pin in self.pinsbyname.items():
+        for pin in self._remote_pin_index().values():
             p = c.pin.add()
-            p.name = '%s.%s' % (self.name, name)
+            p.name = pin.remote_name
             p.type = pin.pintype
             p.dir = pin.direction
             if p.type == HAL_FLOAT:
@@ -266,9 +476,9 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
                 p.hals32 = int(pin.value)
             elif p.type == HAL_U32:
                 p.halu32 = int(pin.value)
-        if self.debug:
-            print('[%s] bind' % self.name)
-        self.send_halrcomp_bind(self._tx)
+        if self.tracer is not None:
+            self.tracer(self.name, 'event', 'bind')
+        self.send_halrcomp_bind(tx)
 
     def add_pins(self):
         self.clear_halrcomp_topics()
@@ -276,6 +486,7 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
 
     def remove_pins(self):
         self.pinsbyhandle = {}
+        self._pin_decoders = {}
 
     def __getitem__(self, k):
         return self.pinsbyname[k].get()
@@ -284,5 +495,273 @@ class RemoteComponent(ComponentBase, RemoteComponentBase, ServiceContainer):
         self.pinsbyname[k].set(v)
 
 
+class _SessionHalrcmdChannel(object):
+    """Replaces the halrcmd channel of a component added to a session."""
+
+    def __init__(self, session, component):
+        self._session = session
+        self._component = component
+        self.socket_uri = ''  # the session channel is connected instead
+
+    def start(self):
+        self._session._start_halrcmd(self._component)
+
+    def stop(self):
+        self._session._stop_halrcmd(self._component)
+
+    def send_socket_message(self, msg_type, tx):
+        self._session._send_halrcmd_message(self._component, msg_type, tx)
+
+
+class _SessionHalrcompChannel(object):
+    """Replaces the halrcomp channel of a component added to a session."""
+
+    def __init__(self, session, component):
+        self._session = session
+        self._component = component
+        self.socket_uri = ''  # the session channel is connected instead
+        self.topics = set()
+
+    def start(self):
+        self._session._start_halrcomp(self._component)
+
+    def stop(self):
+        self._session._stop_halrcomp(self._component)
+
+    def add_socket_topic(self, name):
+        self.topics.add(name)
+
+    def remove_socket_topic(self, name):
+        self.topics.remove(name)
+
+    def clear_socket_topics(self):
+        self.topics.clear()
+
+
+class RemoteComponentSession(ServiceContainer):
+    """Connects many remote components over a single halrcmd and halrcomp channel.
+
+    Bind and set requests of all components are sent over one DEALER
+    socket, updates are received on one SUB socket subscribed to all
+    component names and dispatched by topic. Components must be added
+    before the session becomes ready. Instead of the components, the
+    session is registered with the service discovery.
+    """
+
+    def __init__(self, debug=False):
+        ServiceContainer.__init__(self)
+        self.debug = debug
+        self.components = []
+        self._ready = False
+        self._lock = threading.RLock()
+
+        self._halrcmd_channel = RpcClient(debuglevel=int(debug))
+        self._halrcmd_channel.debugname = 'Remote Component Session - halrcmd'
+        self._halrcmd_channel.on_state_changed.append(
+            self._halrcmd_channel_state_changed
+        )
+        self._halrcmd_channel.on_socket_message_received.append(
+            self._halrcmd_channel_message_received
+        )
+        self._halrcmd_state = 'down'
+        self._halrcmd_users = []  # components that started halrcmd
+        self._pending_binds = deque()  # bind requests are answered in order
+        self._last_set_component = None
+
+        self._halrcomp_channel = HalrcompSubscribe(debuglevel=int(debug))
+        self._halrcomp_channel.debugname = 'Remote Component Session - halrcomp'
+        self._halrcomp_channel.on_state_changed.append(
+            self._halrcomp_channel_state_changed
+        )
+        self._halrcomp_channel.on_socket_message_received.append(
+            self._halrcomp_channel_message_received
+        )
+        self._halrcomp_state = 'down'
+        self._halrcomp_users = []  # components that started halrcomp
+        self._components_by_topic = {}
+
+        self._halrcomp_service = Service(type_='halrcomp')
+        self._halrcmd_service = Service(type_='halrcmd')
+        self.add_service(self._halrcomp_service)
+        self.add_service(self._halrcmd_service)
+        self.on_services_ready_changed.append(self._on_services_ready_changed)
+
+    def _on_services_ready_changed(self, ready):
+        self.halrcomp_uri = self._halrcomp_service.uri
+        self.halrcmd_uri = self._halrcmd_service.uri
+        self.ready = ready
+
+    @property
+    def halrcmd_uri(self):
+        return self._halrcmd_channel.socket_uri
+
+    @halrcmd_uri.setter
+    def halrcmd_uri(self, value):
+        self._halrcmd_channel.socket_uri = value
+
+    @property
+    def halrcomp_uri(self):
+        return self._halrcomp_channel.socket_uri
+
+    @halrcomp_uri.setter
+    def halrcomp_uri(self, value):
+        self._halrcomp_channel.socket_uri = value
+
+    @property
+    def ready(self):
+        return self._ready
+
+    @ready.setter
+    def ready(self, ready):
+        if ready is self._ready:
+            return
+
+        self._ready = ready
+        if ready:
+            self.start()
+        else:
+            self.stop()
+
+    def add_component(self, component):
+        """Routes the communication of component through this session."""
+        # the replaced channels own a context without a reactor, close them
+        component._halrcmd_channel.close()
+        component._halrcomp_channel.close()
+        component._halrcmd_channel = _SessionHalrcmdChannel(self, component)
+        component._halrcomp_channel = _SessionHalrcompChannel(self, component)
+        self.components.append(component)
+        return component
+
+    def start(self):
+        for component in self.components:
+            component.start()
+
+    def stop(self):
+        for component in self.components:
+            component.stop()
+
+    def close(self):
+        """Stops all components and releases the channels of the session."""
+        self.stop()
+        self._halrcmd_channel.close()
+        self._halrcomp_channel.close()
+
+    def _start_halrcmd(self, component):
+        with self._lock:
+            if component in self._halrcmd_users:
+                return
+            self._halrcmd_users.append(component)
+            state = self._halrcmd_state
+        if state == 'down':
+            self._halrcmd_channel.start()
+        elif state == 'up':
+            component._halrcmd_channel_state_changed('up')
+
+    def _stop_halrcmd(self, component):
+        with self._lock:
+            if component not in self._halrcmd_users:
+                return
+            self._halrcmd_users.remove(component)
+            stop = not self._halrcmd_users
+        if stop:
+            self._halrcmd_channel.stop()
+        self._update_halrcomp()  # might have been the last component binding
+
+    def _start_halrcomp(self, component):
+        with self._lock:
+            if component not in self._halrcomp_users:
+                self._halrcomp_users.append(component)
+            state = self._halrcomp_state
+            topics = component._halrcomp_channel.topics
+            if state != 'down':
+                for topic in topics:
+                    self._components_by_topic[topic] = component
+        if state == 'down':
+            self._update_halrcomp()
+            return
+        if state == 'up':
+            component._halrcomp_channel_state_changed('up')
+        # joined the running channel, the subscriptions trigger the full updates
+        for topic in topics:
+            self._halrcomp_channel.subscribe_socket_topic(topic)
+
+    def _stop_halrcomp(self, component):
+        with self._lock:
+            if component not in self._halrcomp_users:
+                return
+            self._halrcomp_users.remove(component)
+            stop = not self._halrcomp_users
+            topics = component._halrcomp_channel.topics
+            if not stop:
+                for topic in topics:
+                    self._components_by_topic.pop(topic, None)
+        if stop:
+            self._halrcomp_channel.stop()
+            return
+        for topic in topics:
+            self._halrcomp_channel.unsubscribe_socket_topic(topic)
+
+    def _update_halrcomp(self):
+        # subscribe once all connected components are bound, the server
+        # sends the full updates when the subscriptions arrive
+        channel = self._halrcomp_channel
+        with self._lock:
+            users = self._halrcomp_users
+            if self._halrcomp_state != 'down' or not users:
+                return
+            if any(component not in users for component in self._halrcmd_users):
+                return
+            channel.clear_socket_topics()
+            self._components_by_topic = {}
+            for component in users:
+                for topic in component._halrcomp_channel.topics:
+                    channel.add_socket_topic(topic)
+                    self._components_by_topic[topic] = component
+        channel.start()
+
+    def _send_halrcmd_message(self, component, msg_type, tx):
+        with self._lock:
+            if msg_type == pb.MT_HALRCOMP_BIND:
+                self._pending_binds.append(component)
+            elif msg_type == pb.MT_HALRCOMP_SET:
+                self._last_set_component = component
+        self._halrcmd_channel.send_socket_message(msg_type, tx)
+
+    def _halrcmd_channel_state_changed(self, state):
+        with self._lock:
+            self._halrcmd_state = state
+            if state != 'up':
+                self._pending_binds.clear()  # components bind again when up
+            components = list(self._halrcmd_users)
+        for component in components:
+            component._halrcmd_channel_state_changed(state)
+
+    def _halrcmd_channel_message_received(self, rx):
+        with self._lock:
+            if rx.type in (pb.MT_HALRCOMP_BIND_CONFIRM, pb.MT_HALRCOMP_BIND_REJECT):
+                pending = self._pending_binds
+                components = [pending.popleft()] if pending else []
+            elif rx.type == pb.MT_HALRCOMP_SET_REJECT:
+                # set requests carry no reply, attribute it to the last sender
+                component = self._last_set_component
+                components = [component] if component is not None else []
+            else:
+                components = list(self._halrcmd_users)
+        for component in components:
+            component._halrcmd_channel_message_received(rx)
+
+    def _halrcomp_channel_state_changed(self, state):
+        with self._lock:
+            self._halrcomp_state = state
+            components = list(self._halrcomp_users)
+        for component in components:
+            component._halrcomp_channel_state_changed(state)
+
+    def _halrcomp_channel_message_received(self, topic, rx):
+        component = self._components_by_topic.get(topic)
+        if component is not None:
+            component._halrcomp_channel_message_received(topic, rx)
+
+
 def component(name):
     return RemoteComponent(name)
@@ -1,6 +1,7 @@
 # coding=utf-8
 from fysom import Fysom
 from ..common.publish import Publish
+from ..common.trace import get_tracer
 
 import machinetalk.protobuf.types_pb2 as pb
 from machinetalk.protobuf.message_pb2 import Container
@@ -38,29 +39,38 @@ class LogServiceBase(object):
         self._fsm.onup = self._on_fsm_up
         self._fsm.onafterdisconnect = self._on_fsm_disconnect
 
+    @property
+    def debuglevel(self):
+        return self._debuglevel
+
+    @debuglevel.setter
+    def debuglevel(self, debuglevel):
+        self._debuglevel = debuglevel
+        self.tracer = get_tracer(debuglevel)  # None when tracing is disabled
+
     def _on_fsm_down(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state DOWN' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'DOWN')
         for cb in self.on_state_changed:
             cb('down')
         return True
 
     def _on_fsm_connect(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event CONNECT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'CONNECT')
         self.start_log_channel()
         return True
 
     def _on_fsm_up(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state UP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'UP')
         for cb in self.on_state_changed:
             cb('up')
         return True
 
     def _on_fsm_disconnect(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event DISCONNECT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'DISCONNECT')
         self.stop_log_channel()
         return True
 
@@ -0,0 +1,137 @@
+# coding=utf-8
+import asyncio
+import sys
+import threading
+import traceback
+
+import zmq
+import zmq.asyncio
+
+from ..common.reactor import set_default_reactor
+
+
+class AsyncioTimer(object):
+    """One-shot timer scheduled with call_later on the reactor loop."""
+
+    def __init__(self, reactor, callback):
+        self._reactor = reactor
+        self._callback = callback
+        self._handle = None
+
+    @property
+    def active(self):
+        return self._handle is not None
+
+    def start(self, interval):
+        if self._reactor.in_reactor_thread():
+            self._start(interval)
+        else:
+            self._reactor.call(self._start, interval)
+
+    def cancel(self):
+        if self._reactor.in_reactor_thread():
+            self._cancel()
+        else:
+            self._reactor.call(self._cancel)
+
+    def _start(self, interval):
+        self._cancel()
+        self._handle = self._reactor.loop.call_later(interval, self._fire)
+
+    def _cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _fire(self):
+        self._handle = None
+        self._callback()
+
+
+class AsyncioReactor(object):
+    """Reactor running all channels inside an asyncio event loop.
+
+    Every socket is watched by a task awaiting zmq.asyncio readiness,
+    heartbeat timers use the loop's call_later. No threads are created,
+    so any number of components can be driven by a single event loop.
+    All channel callbacks are invoked from the loop.
+    """
+
+    def __init__(self, loop=None):
+        context = zmq.Context()
+        context.linger = 0
+        self._context = context
+        self._loop = loop if loop is not None else asyncio.get_event_loop()
+        self._thread_ident = None
+        self._tasks = {}  # socket -> watcher task
+        self._loop.call_soon_threadsafe(self._bind_thread)
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def loop(self):
+        return self._loop
+
+    @property
+    def running(self):
+        return not self._context.closed
+
+    def _bind_thread(self):
+        self._thread_ident = threading.get_ident()
+
+    def in_reactor_thread(self):
+        return threading.get_ident() == self._thread_ident
+
+    def start(self):
+        pass  # driven by the event loop
+
+    def stop(self):
+        """Stops watching all sockets and destroys the context."""
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._context.destroy(linger=0)
+
+    def call(self, callback, *args):
+        """Queues a callback for execution in the event loop, thread-safe."""
+        self._loop.call_soon_threadsafe(self._dispatch, callback, *args)
+
+    def call_priority(self, callback, *args):
+        # the event loop has no priorities, sends are not queued behind
+        # anything but other ready callbacks
+        self.call(callback, *args)
+
+    def add_socket(self, socket, handler):
+        self._tasks[socket] = self._loop.create_task(self._watch(socket, handler))
+
+    def remove_socket(self, socket):
+        task = self._tasks.pop(socket, None)
+        if task is not None:
+            task.cancel()
+
+    def create_timer(self, callback):
+        return AsyncioTimer(self, callback)
+
+    @staticmethod
+    def _dispatch(callback, *args):
+        # a faulty channel must not take down the other channels
+        try:
+            callback(*args)
+        except Exception:
+            sys.stderr.write('Error: exception in reactor callback\n')
+            traceback.print_exc()
+
+    async def _watch(self, socket, handler):
+        async_socket = zmq.asyncio.Socket.from_socket(socket)
+        while not socket.closed:
+            await async_socket.poll(flags=zmq.POLLIN)
+            self._dispatch(handler, socket)
+
+
+def use_asyncio_reactor(loop=None):
+    """Runs all channels created afterwards in the given asyncio loop."""
+    reactor = AsyncioReactor(loop)
+    set_default_reactor(reactor)
+    return reactor
@@ -0,0 +1,145 @@
+# coding=utf-8
+import threading
+import warnings
+
+from google.protobuf.internal import api_implementation
+
+import machinetalk.protobuf.types_pb2 as pb
+from machinetalk.protobuf.message_pb2 import Container
+
+
+def protobuf_backend():
+    """Returns the active protobuf backend, 'python', 'upb' or 'cpp'."""
+    return api_implementation.Type()
+
+
+class Codec(object):
+    """Wire codec used by the channels, fully parses every message."""
+
+    def decode(self, data, message):
+        """Parses data into message and returns the decoded message.
+
+        Raises DecodeError for malformed data.
+        """
+        message.ParseFromString(data)
+        return message
+
+    def encode(self, message):
+        return message.SerializeToString()
+
+
+class LazyCodec(Codec):
+    """Codec skipping the full parse of uninteresting message types.
+
+    Messages of one of the skip_types that carry nothing but the type
+    field are not parsed, a shared message is returned instead of message
+    and must not be modified. Messages with further fields, e.g. pings
+    with keepalive parameters, are fully parsed.
+    """
+
+    def __init__(self, skip_types=(pb.MT_PING, pb.MT_PING_ACKNOWLEDGE)):
+        self._skipped = {}  # type -> shared message
+        for msg_type in skip_types:
+            self._skipped[msg_type] = Container(type=msg_type)
+
+    @property
+    def skip_types(self):
+        return frozenset(self._skipped)
+
+    def decode(self, data, message):
+        skipped = self._skipped.get(bare_type(data))
+        if skipped is not None:
+            return skipped
+        message.ParseFromString(data)
+        return message
+
+
+def bare_type(data):
+    """Returns the type of an encoded message without any other field.
+
+    Returns None if the message has other fields or cannot be scanned.
+    """
+    # the type is serialized as 1 or 2 byte varint, no room for other fields
+    size = len(data)
+    if size == 2 and data[0] == 0x08 and not data[1] & 0x80:
+        return data[1]
+    if size == 3 and data[0] == 0x08 and data[1] & 0x80 and not data[2] & 0x80:
+        return (data[1] & 0x7F) | (data[2] << 7)
+    return None
+
+
+def peek_type(data):
+    """Returns the top-level type field (number 1) of an encoded message.
+
+    Returns None if the field is missing or the data cannot be scanned,
+    the message must be fully parsed in that case.
+    """
+    # fast path, type is the first field and serialized as 1 or 2 byte varint
+    if len(data) >= 3 and data[0] == 0x08:
+        low = data[1]
+        if not low & 0x80:
+            return low
+        high = data[2]
+        if not high & 0x80:
+            return (low & 0x7F) | (high << 7)
+
+    data = memoryview(data)
+    end = len(data)
+    pos = 0
+    try:
+        while pos < end:
+            tag, pos = _read_varint(data, pos)
+            wire_type = tag & 0x07
+            if wire_type == 0:
+                value, pos = _read_varint(data, pos)
+                if tag >> 3 == 1:
+                    return value
+            elif wire_type == 1:
+                pos += 8
+            elif wire_type == 2:
+                length, pos = _read_varint(data, pos)
+                pos += length
+            elif wire_type == 5:
+                pos += 4
+            else:
+                return None  # groups are not used by machinetalk
+    except IndexError:
+        pass  # truncated, left for the full parse to report
+    return None
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+_default_codec = None
+_default_codec_lock = threading.Lock()
+
+
+def get_default_codec():
+    """Returns the codec new channels use, warns about slow protobuf backends."""
+    global _default_codec
+    with _default_codec_lock:
+        if _default_codec is None:
+            if protobuf_backend() == 'python':
+                warnings.warn(
+                    'protobuf is using the pure-Python backend, install the '
+                    'upb or cpp backend for faster message processing',
+                    RuntimeWarning,
+                )
+            _default_codec = LazyCodec()
+        return _default_codec
+
+
+def set_default_codec(codec):
+    global _default_codec
+    with _default_codec_lock:
+        _default_codec = codec
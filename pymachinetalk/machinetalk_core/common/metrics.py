@@ -0,0 +1,222 @@
+# coding=utf-8
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+try:
+    from time import perf_counter_ns
+except ImportError:  # Python < 3.7
+    from time import perf_counter
+
+    def perf_counter_ns():
+        return int(perf_counter() * 1e9)
+
+from machinetalk.protobuf.types_pb2 import ContainerType
+
+
+class Histogram(object):
+    """Log-linear histogram of non-negative integers, in the style of HDR.
+
+    Values are counted in buckets with significant_bits of precision, so
+    the relative error stays bounded over the whole range while memory
+    only grows with the number of distinct buckets hit.
+    """
+
+    def __init__(self, significant_bits=4):
+        self._bits = significant_bits
+        self._half = 1 << (significant_bits - 1)
+        self.reset()
+
+    def reset(self):
+        self._counts = {}  # bucket index -> count
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0
+        magnitude = value.bit_length() - self._bits
+        if magnitude < 0:
+            magnitude = 0
+        index = magnitude * self._half + (value >> magnitude)
+        counts = self._counts
+        counts[index] = counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Returns the lower bound of the bucket holding the percentile."""
+        if not self.count:
+            return 0
+        threshold = self.count * percent / 100.0
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= threshold:
+                return self._bucket_value(index)
+        return self.max
+
+    def _bucket_value(self, index):
+        magnitude = max(index // self._half - 1, 0)
+        return (index - magnitude * self._half) << magnitude
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'min': self.min or 0,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max or 0,
+        }
+
+
+class ChannelMetrics(object):
+    """Counters and latency histograms of a single channel.
+
+    Channels only record into it while it is assigned to their metrics
+    attribute, otherwise the instrumentation is a single None check.
+    """
+
+    def __init__(self):
+        self.parse_ns = Histogram()
+        self.callback_ns = Histogram()
+        self.batch_size = Histogram()  # messages drained per wakeup
+        self.reset()
+
+    def reset(self):
+        self.started = monotonic()
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.messages_sent = 0
+        self.bytes_sent = 0
+        self.heartbeat_misses = 0
+        self.reconnects = 0
+        self.parse_ns.reset()
+        self.callback_ns.reset()
+        self.batch_size.reset()
+
+    def message_received(self, size, parse_ns):
+        self.messages_received += 1
+        self.bytes_received += size
+        self.parse_ns.record(parse_ns)
+
+    def message_sent(self, size):
+        self.messages_sent += 1
+        self.bytes_sent += size
+
+    def summary(self):
+        """Returns all metrics as dict, rates are averaged since the last reset."""
+        elapsed = max(monotonic() - self.started, 1e-9)
+        return {
+            'messages_received': self.messages_received,
+            'bytes_received': self.bytes_received,
+            'messages_sent': self.messages_sent,
+            'bytes_sent': self.bytes_sent,
+            'messages_per_second': self.messages_received / elapsed,
+            'bytes_per_second': self.bytes_received / elapsed,
+            'heartbeat_misses': self.heartbeat_misses,
+            'reconnects': self.reconnects,
+            'parse_ns': self.parse_ns.summary(),
+            'callback_ns': self.callback_ns.summary(),
+            'batch_size': self.batch_size.summary(),
+        }
+
+
+class CommandLatencyMetrics(object):
+    """Round-trip latencies of commands, one histogram per message type.
+
+    Sent tickets are remembered until both their executed and completed
+    replies arrived, at most max_pending tickets are kept for commands
+    that are never answered.
+    """
+
+    def __init__(self, max_pending=10000):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.executed_ns = {}  # message type name -> Histogram
+            self.completed_ns = {}
+            self._awaiting_executed = OrderedDict()  # ticket -> (name, sent_ns)
+            self._awaiting_completed = OrderedDict()
+
+    def command_sent(self, ticket, msg_type, sent_ns):
+        entry = (ContainerType.Name(msg_type), sent_ns)
+        with self._lock:
+            for awaiting in (self._awaiting_executed, self._awaiting_completed):
+                awaiting[ticket] = entry
+                if len(awaiting) > self.max_pending:
+                    awaiting.popitem(last=False)
+
+    def command_executed(self, reply_ticket, received_ns, exact=False):
+        """Records the reply, exact replies do not acknowledge older tickets."""
+        with self._lock:
+            self._record(
+                self._awaiting_executed,
+                self.executed_ns,
+                reply_ticket,
+                received_ns,
+                exact,
+            )
+
+    def command_completed(self, reply_ticket, received_ns, exact=False):
+        with self._lock:
+            self._record(
+                self._awaiting_completed,
+                self.completed_ns,
+                reply_ticket,
+                received_ns,
+                exact,
+            )
+
+    def clear_pending(self, before=None):
+        """Forgets all sent tickets or those before a ticket, their replies are lost."""
+        with self._lock:
+            for awaiting in (self._awaiting_executed, self._awaiting_completed):
+                if before is None:
+                    awaiting.clear()
+                    continue
+                for ticket in [ticket for ticket in awaiting if ticket < before]:
+                    del awaiting[ticket]
+
+    # must be called with the lock held
+    @staticmethod
+    def _record(awaiting, histograms, reply_ticket, received_ns, exact):
+        if exact:
+            tickets = [reply_ticket] if reply_ticket in awaiting else []
+        else:
+            # tickets are sent in order, a reply acknowledges all older tickets
+            tickets = [ticket for ticket in awaiting if ticket <= reply_ticket]
+        for ticket in tickets:
+            name, sent_ns = awaiting.pop(ticket)
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = Histogram()
+            histogram.record(received_ns - sent_ns)
+
+    def summary(self):
+        with self._lock:
+            return {
+                'executed_ns': {
+                    name: histogram.summary()
+                    for name, histogram in self.executed_ns.items()
+                },
+                'completed_ns': {
+                    name: histogram.summary()
+                    for name, histogram in self.completed_ns.items()
+                },
+            }
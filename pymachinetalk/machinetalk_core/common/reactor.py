@@ -0,0 +1,189 @@
+# coding=utf-8
+import sys
+import threading
+import traceback
+import uuid
+from collections import deque
+
+import zmq
+
+from ..common.timerscheduler import get_timer_scheduler
+
+
+class Reactor(object):
+    """Process-wide ZeroMQ context with a single poll loop thread.
+
+    Channels using a reactor do not create their own context and socket
+    worker thread. Instead they hand their sockets to the reactor, which
+    multiplexes all of them in one poll loop and dispatches readable
+    sockets to the registered handlers.
+
+    Sockets must only be touched from the reactor thread. Use ``call`` to
+    run code there, ``add_socket`` and ``remove_socket`` may only be used
+    from within such a call.
+    """
+
+    def __init__(self):
+        context = zmq.Context()
+        context.linger = 0
+        self._context = context
+        self._thread = None  # poll loop thread
+        self._start_lock = threading.Lock()
+        self._running = False
+
+        self._poll = zmq.Poller()
+        self._handlers = {}  # socket -> handler
+
+        # queued calls, executed in the reactor thread
+        self._calls = deque()
+        self._priority_calls = deque()  # executed ahead of all queued calls
+        self._wakeup_lock = threading.Lock()
+        self._wakeup_pending = False
+        self._wakeup = context.socket(zmq.PUSH)
+        self._wakeup_uri = b'inproc://reactor-%s' % str(uuid.uuid4()).encode()
+        self._wakeup.bind(self._wakeup_uri)
+        self._wakeup_rx = context.socket(zmq.PULL)
+        self._wakeup_rx.connect(self._wakeup_uri)
+        self._poll.register(self._wakeup_rx, zmq.POLLIN)
+
+    @property
+    def context(self):
+        return self._context
+
+    @property
+    def running(self):
+        return self._running
+
+    def in_reactor_thread(self):
+        return threading.current_thread() is self._thread
+
+    def start(self):
+        with self._start_lock:
+            if self._running:
+                return
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._run, name='machinetalk-reactor'
+            )
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stops the poll loop and destroys the context, not restartable."""
+        if self.in_reactor_thread():
+            raise RuntimeError('Reactor cannot be stopped from its own thread')
+        with self._start_lock:
+            running = self._running
+            thread = self._thread
+        if running:
+            self.call(self._shutdown)
+            thread.join()
+        self._context.destroy(linger=0)
+
+    def call(self, callback, *args):
+        """Queues a callback for execution in the reactor thread, thread-safe."""
+        self._queue_call(self._calls, callback, args)
+
+    def call_priority(self, callback, *args):
+        """Like call, but runs the callback before all calls queued so far."""
+        self._queue_call(self._priority_calls, callback, args)
+
+    def _queue_call(self, calls, callback, args):
+        if not self._running:
+            if self._context.closed:
+                raise RuntimeError('Reactor has been stopped')
+            self.start()
+        with self._wakeup_lock:
+            calls.append((callback, args))
+            if not self._wakeup_pending:
+                self._wakeup_pending = True
+                self._wakeup.send(b' ')
+
+    def add_socket(self, socket, handler):
+        self._handlers[socket] = handler
+        self._poll.register(socket, zmq.POLLIN)
+
+    def remove_socket(self, socket):
+        if self._handlers.pop(socket, None) is not None:
+            self._poll.unregister(socket)
+
+    @staticmethod
+    def create_timer(callback):
+        return get_timer_scheduler().create_timer(callback)
+
+    def _shutdown(self):
+        self._running = False
+
+    def _process_calls(self):
+        with self._wakeup_lock:
+            self._wakeup_pending = False
+            self._wakeup_rx.recv()
+        calls = self._calls
+        priority_calls = self._priority_calls
+        while calls or priority_calls:
+            if priority_calls:
+                callback, args = priority_calls.popleft()
+            else:
+                callback, args = calls.popleft()
+            self._dispatch(callback, *args)
+
+    @staticmethod
+    def _dispatch(callback, *args):
+        # a faulty channel must not take down the loop shared by all others
+        try:
+            callback(*args)
+        except Exception:
+            sys.stderr.write('Error: exception in reactor callback\n')
+            traceback.print_exc()
+
+    def _run(self):
+        wakeup = self._wakeup_rx
+        handlers = self._handlers
+        while self._running:
+            for socket, _ in self._poll.poll():
+                if socket is wakeup:
+                    self._process_calls()
+                else:
+                    handler = handlers.get(socket)
+                    if handler is not None:  # might be removed in the meantime
+                        self._dispatch(handler, socket)
+
+        for socket in list(handlers):
+            self.remove_socket(socket)
+            socket.close()
+
+
+_default_reactor = None
+_default_reactor_lock = threading.Lock()
+
+
+def get_default_reactor():
+    """Returns the reactor new channels attach to, None for thread per channel."""
+    return _default_reactor
+
+
+def set_default_reactor(reactor):
+    global _default_reactor
+    with _default_reactor_lock:
+        _default_reactor = reactor
+
+
+def create_timer(callback):
+    """Creates a timer running callback where the channels run theirs.
+
+    Uses the default reactor, e.g. the event loop of an AsyncioReactor,
+    and the timer scheduler thread for thread per channel.
+    """
+    reactor = _default_reactor
+    if reactor is not None:
+        return reactor.create_timer(callback)
+    return get_timer_scheduler().create_timer(callback)
+
+
+def use_shared_reactor():
+    """Opts in to the shared reactor for all channels created afterwards."""
+    global _default_reactor
+    with _default_reactor_lock:
+        if _default_reactor is None:
+            _default_reactor = Reactor()
+        return _default_reactor
@@ -7,6 +7,11 @@ from fysom import Fysom
 
 import machinetalk.protobuf.types_pb2 as pb
 from machinetalk.protobuf.message_pb2 import Container
+from ..common.codec import get_default_codec
+from ..common.metrics import perf_counter_ns
+from ..common.reactor import get_default_reactor
+from ..common.timerscheduler import get_timer_scheduler
+from ..common.trace import get_tracer, logger
 
 
 class RpcClient(object):
@@ -16,30 +21,52 @@ class RpcClient(object):
         self._error_string = ''
         self.on_error_string_changed = []
         # ZeroMQ
-        context = zmq.Context()
-        context.linger = 0
+        self._reactor = get_default_reactor()  # None for a socket worker thread
+        if self._reactor is not None:
+            context = self._reactor.context  # shared process-wide context
+        else:
+            context = zmq.Context()
+            context.linger = 0
+            # pipe to signalize a shutdown
+            self._shutdown = context.socket(zmq.PUSH)
+            self._shutdown_uri = b'inproc://shutdown-%s' % str(uuid.uuid4()).encode()
+            self._shutdown.bind(self._shutdown_uri)
+            # pipe for outgoing messages
+            self._pipe = context.socket(zmq.PUSH)
+            self._pipe_uri = b'inproc://pipe-%s' % str(uuid.uuid4()).encode()
+            self._pipe.bind(self._pipe_uri)
+            # pipe for outgoing messages sent ahead of the queued ones
+            self._priority_pipe = context.socket(zmq.PUSH)
+            self._priority_pipe_uri = (
+                b'inproc://priority-%s' % str(uuid.uuid4()).encode()
+            )
+            self._priority_pipe.bind(self._priority_pipe_uri)
         self._context = context
-        # pipe to signalize a shutdown
-        self._shutdown = context.socket(zmq.PUSH)
-        self._shutdown_uri = b'inproc://shutdown-%s' % str(uuid.uuid4()).encode()
-        self._shutdown.bind(self._shutdown_uri)
-        # pipe for outgoing messages
-        self._pipe = context.socket(zmq.PUSH)
-        self._pipe_uri = b'inproc://pipe-%s' % str(uuid.uuid4()).encode()
-        self._pipe.bind(self._pipe_uri)
         self._thread = None  # socket worker tread
+        self._socket = None  # socket owned by the reactor thread
         self._tx_lock = threading.Lock()  # lock for outgoing messages
+        self._priority_tx_lock = threading.Lock()
+        # queued messages with a ticket below are dropped instead of sent
+        self._discard_ticket = 0
 
         # Socket
         self.socket_uri = ''
+        self._codec = get_default_codec()
+        self.metrics = None  # ChannelMetrics when instrumentation is enabled
         # more efficient to reuse protobuf messages
         self._socket_rx = Container()
-        self._socket_tx = Container()
+        # receive batching, drain up to batch size messages per wakeup
+        self.socket_batch_size = 64
+        self.socket_batch_count = 0  # number of wakeups with messages
+        self.socket_message_count = 0  # number of handled messages
+        self.socket_max_batch_size = 0  # largest batch seen
 
         # Heartbeat
         self._heartbeat_lock = threading.Lock()
         self._heartbeat_interval = 2500
-        self._heartbeat_timer = None
+        # the reactor decides where timers run, e.g. in an asyncio loop
+        timers = self._reactor if self._reactor is not None else get_timer_scheduler()
+        self._heartbeat_timer = timers.create_timer(self._heartbeat_timer_tick)
         self._heartbeat_active = False
         self._heartbeat_liveness = 0
         self._heartbeat_reset_liveness = 5
@@ -78,16 +105,25 @@ class RpcClient(object):
         self._fsm.onafterstop = self._on_fsm_stop
         self._fsm.onup = self._on_fsm_up
 
+    @property
+    def debuglevel(self):
+        return self._debuglevel
+
+    @debuglevel.setter
+    def debuglevel(self, debuglevel):
+        self._debuglevel = debuglevel
+        self.tracer = get_tracer(debuglevel)  # None when tracing is disabled
+
     def _on_fsm_down(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state DOWN' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'DOWN')
         for cb in self.on_state_changed:
             cb('down')
         return True
 
     def _on_fsm_start(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event START' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'START')
         self.start_socket()
         self.reset_heartbeat_liveness()
         self.send_ping()
@@ -95,22 +131,24 @@ class RpcClient(object):
         return True
 
     def _on_fsm_trying(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state TRYING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'TRYING')
         for cb in self.on_state_changed:
             cb('trying')
         return True
 
     def _on_fsm_any_msg_received(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event ANY MSG RECEIVED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'ANY MSG RECEIVED')
         self.reset_heartbeat_liveness()
         self.reset_heartbeat_timer()
         return True
 
     def _on_fsm_heartbeat_timeout(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HEARTBEAT TIMEOUT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HEARTBEAT TIMEOUT')
+        if self.metrics is not None:
+            self.metrics.reconnects += 1
         self.stop_socket()
         self.start_socket()
         self.reset_heartbeat_liveness()
@@ -118,27 +156,27 @@ class RpcClient(object):
         return True
 
     def _on_fsm_heartbeat_tick(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HEARTBEAT TICK' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HEARTBEAT TICK')
         self.send_ping()
         return True
 
     def _on_fsm_any_msg_sent(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event ANY MSG SENT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'ANY MSG SENT')
         self.reset_heartbeat_timer()
         return True
 
     def _on_fsm_stop(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event STOP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'STOP')
         self.stop_heartbeat_timer()
         self.stop_socket()
         return True
 
     def _on_fsm_up(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state UP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'UP')
         for cb in self.on_state_changed:
             cb('up')
         return True
@@ -165,31 +203,73 @@ class RpcClient(object):
         elif self._fsm.isstate('up'):
             self._fsm.stop()
 
+    def close(self):
+        """Stops the channel and releases its sockets, it cannot be restarted.
+
+        Without a reactor the channel owns a context, which deadlocks when it
+        is left to the garbage collector. Must not be called from a callback.
+        """
+        self.stop()
+        if self._reactor is not None:
+            return
+        if self._thread is not None:
+            self._thread.join()
+        self._context.destroy(linger=0)
+
     def _socket_worker(self, context, uri):
         poll = zmq.Poller()
-        socket = context.socket(zmq.DEALER)
-        socket.setsockopt(zmq.LINGER, 0)
-        socket.connect(uri)
-        poll.register(socket, zmq.POLLIN)
-
+        # registered in order of priority, poll results are in registration order
         shutdown = context.socket(zmq.PULL)
         shutdown.connect(self._shutdown_uri)
         poll.register(shutdown, zmq.POLLIN)
+        priority_pipe = context.socket(zmq.PULL)
+        priority_pipe.connect(self._priority_pipe_uri)
+        poll.register(priority_pipe, zmq.POLLIN)
         pipe = context.socket(zmq.PULL)
         pipe.connect(self._pipe_uri)
         poll.register(pipe, zmq.POLLIN)
 
+        socket = context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(uri)
+        poll.register(socket, zmq.POLLIN)
+
+        while True:
+            for ready, _ in poll.poll():
+                if ready is shutdown:
+                    shutdown.recv()
+                    return  # shutdown signal
+                elif ready is priority_pipe:
+                    self._priority_pipe_readable(priority_pipe, socket)
+                elif ready is pipe:
+                    self._pipe_readable(pipe, socket, priority_pipe)
+                else:
+                    self._socket_readable(socket)
+
+    def _pipe_readable(self, pipe, socket, priority_pipe):
+        # forward all queued outgoing messages up to the batch size
+        count = 0
         while True:
-            s = dict(poll.poll())
-            if shutdown in s:
-                shutdown.recv()
-                return  # shutdown signal
-            if pipe in s:
-                socket.send(pipe.recv(), zmq.NOBLOCK)
-            if socket in s:
-                self._socket_message_received(socket)
+            if priority_pipe.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                self._priority_pipe_readable(priority_pipe, socket)
+            ticket, data = pipe.recv_multipart()
+            if not self._discarded(int.from_bytes(ticket, 'little')):
+                socket.send(data, zmq.NOBLOCK)
+            count += 1
+            if count >= self.socket_batch_size:
+                break
+            if not pipe.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                break
+
+    def _priority_pipe_readable(self, pipe, socket):
+        # priority messages are rare, forward all of them
+        while pipe.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            socket.send(pipe.recv(), zmq.NOBLOCK)
 
     def start_socket(self):
+        if self._reactor is not None:
+            self._reactor.call(self._start_reactor_socket, self.socket_uri)
+            return
         self._thread = threading.Thread(
             target=self._socket_worker,
             args=(
@@ -200,17 +280,35 @@ class RpcClient(object):
         self._thread.start()
 
     def stop_socket(self):
+        if self._reactor is not None:
+            self._reactor.call(self._stop_reactor_socket)
+            return
         self._shutdown.send(b' ')  # trigger socket thread shutdown
-        self._thread = None
 
-    def _heartbeat_timer_tick(self):
-        with self._heartbeat_lock:
-            self._heartbeat_timer = None  # timer is dead on tick
+    def _start_reactor_socket(self, uri):
+        socket = self._context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(uri)
+        self._socket = socket
+        self._reactor.add_socket(socket, self._socket_readable)
+
+    def _stop_reactor_socket(self):
+        if self._socket is None:
+            return
+        self._reactor.remove_socket(self._socket)
+        self._socket.close()
+        self._socket = None
 
-        if self.debuglevel > 0:
-            print('[%s] heartbeat timer tick' % self.debugname)
+    def _heartbeat_timer_tick(self):
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'heartbeat', 'tick')
 
         self._heartbeat_liveness -= 1
+        # the first tick only pings an idle connection
+        metrics = self.metrics
+        if metrics is not None:
+            if self._heartbeat_liveness < self._heartbeat_reset_liveness - 1:
+                metrics.heartbeat_misses += 1
         if self._heartbeat_liveness == 0:
             if self._fsm.isstate('up'):
                 self._fsm.heartbeat_timeout()
@@ -231,18 +329,13 @@ class RpcClient(object):
             return
 
         self._heartbeat_lock.acquire()
-        if self._heartbeat_timer:
-            self._heartbeat_timer.cancel()
-            self._heartbeat_timer = None
-
         if self._heartbeat_interval > 0:
-            self._heartbeat_timer = threading.Timer(
-                self._heartbeat_interval / 1000.0, self._heartbeat_timer_tick
-            )
-            self._heartbeat_timer.start()
+            self._heartbeat_timer.start(self._heartbeat_interval / 1000.0)
+        else:
+            self._heartbeat_timer.cancel()
         self._heartbeat_lock.release()
-        if self.debuglevel > 0:
-            print('[%s] heartbeat timer reset' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'heartbeat', 'reset')
 
     def start_heartbeat_timer(self):
         self._heartbeat_active = True
@@ -251,27 +344,69 @@ class RpcClient(object):
     def stop_heartbeat_timer(self):
         self._heartbeat_active = False
         self._heartbeat_lock.acquire()
-        if self._heartbeat_timer:
-            self._heartbeat_timer.cancel()
-            self._heartbeat_timer = None
+        self._heartbeat_timer.cancel()
         self._heartbeat_lock.release()
 
+    def _send_reactor_message(self, data):
+        if self._socket is not None:
+            self._socket.send(data, zmq.NOBLOCK)
+
+    def _send_queued_reactor_message(self, ticket, data):
+        if not self._discarded(ticket):
+            self._send_reactor_message(data)
+
+    def discard_queued_messages(self, ticket):
+        """Drops all queued messages with a ticket below ticket.
+
+        Also applies to messages queued later, e.g. by a thread that took
+        its ticket before. Messages without a ticket and priority messages
+        are never dropped, messages already handed to the socket cannot be
+        recalled.
+        """
+        with self._priority_tx_lock:
+            if ticket > self._discard_ticket:
+                self._discard_ticket = ticket
+
+    def _discarded(self, ticket):
+        return 0 < ticket < self._discard_ticket
+
+    def _socket_readable(self, socket):
+        # drain all pending messages up to the batch size before polling again
+        count = 0
+        while True:
+            self._socket_message_received(socket)
+            count += 1
+            if count >= self.socket_batch_size:
+                break
+            if not socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                break
+        self.socket_batch_count += 1
+        self.socket_message_count += count
+        if count > self.socket_max_batch_size:
+            self.socket_max_batch_size = count
+        if self.metrics is not None:
+            self.metrics.batch_size.record(count)
+
     # process all messages received on socket
     def _socket_message_received(self, socket):
         msg = socket.recv()
 
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter_ns()
         try:
-            self._socket_rx.ParseFromString(msg)
+            rx = self._codec.decode(msg, self._socket_rx)
         except DecodeError as e:
             note = 'Protobuf Decode Error: ' + str(e)
-            print(note)  # TODO: decode error
+            logger.warning('[%s] %s', self.debugname, note)
+            if self.tracer is not None:
+                self.tracer(self.debugname, 'error', note)
             return
+        if metrics is not None:
+            metrics.message_received(len(msg), perf_counter_ns() - start)
 
-        if self.debuglevel > 0:
-            print('[%s] received message' % self.debugname)
-            if self.debuglevel > 1:
-                print(self._socket_rx)
-        rx = self._socket_rx
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'receive', rx.type, rx)
 
         # react to any incoming message
         if self._fsm.isstate('trying'):
@@ -283,19 +418,40 @@ class RpcClient(object):
         if rx.type == pb.MT_PING_ACKNOWLEDGE:
             return  # ping acknowledge is uninteresting
 
+        if metrics is not None:
+            start = perf_counter_ns()
         for cb in self.on_socket_message_received:
             cb(rx)
-
-    def send_socket_message(self, msg_type, tx):
-        with self._tx_lock:
-            tx.type = msg_type
-            if self.debuglevel > 0:
-                print('[%s] sending message: %s' % (self.debugname, msg_type))
-                if self.debuglevel > 1:
-                    print(str(tx))
-
-            self._pipe.send(tx.SerializeToString())
-            tx.Clear()
+        if metrics is not None:
+            metrics.callback_ns.record(perf_counter_ns() - start)
+
+    def send_socket_message(self, msg_type, tx, priority=False):
+        """Sends a message, priority messages overtake all queued messages.
+
+        The message is serialized outside of the lock, therefore tx must not
+        be shared between threads.
+        """
+        tx.type = msg_type
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'send', msg_type, tx)
+
+        # serialize outside of the lock, only the pipe is shared between threads
+        ticket = tx.ticket
+        data = self._codec.encode(tx)
+        tx.Clear()
+        # separate locks, a full pipe must not hold up priority messages
+        with self._priority_tx_lock if priority else self._tx_lock:
+            if self.metrics is not None:
+                self.metrics.message_sent(len(data))
+            if priority:
+                if self._reactor is None:
+                    self._priority_pipe.send(data)
+                else:
+                    self._reactor.call_priority(self._send_reactor_message, data)
+            elif self._reactor is None:
+                self._pipe.send_multipart((ticket.to_bytes(8, 'little'), data))
+            else:
+                self._reactor.call(self._send_queued_reactor_message, ticket, data)
 
         if self._fsm.isstate('up'):
             self._fsm.any_msg_sent()
@@ -303,5 +459,6 @@ class RpcClient(object):
             self._fsm.any_msg_sent()
 
     def send_ping(self):
-        tx = self._socket_tx
+        # pings are sent from several threads, never share the message
+        tx = Container()
         self.send_socket_message(pb.MT_PING, tx)
@@ -0,0 +1,123 @@
+# coding=utf-8
+import heapq
+import itertools
+import sys
+import threading
+import traceback
+from time import monotonic
+
+
+class Timer(object):
+    """One-shot timer driven by a TimerScheduler.
+
+    Restarting an armed timer only moves its deadline, no thread is
+    created and in the common case of a later deadline the scheduler
+    heap is not touched either.
+    """
+
+    def __init__(self, scheduler, callback):
+        self._scheduler = scheduler
+        self._callback = callback
+        self._deadline = None  # None when not armed
+        self._entry = None  # live heap entry, older entries are stale
+
+    @property
+    def active(self):
+        return self._deadline is not None
+
+    def start(self, interval):
+        """(Re)arms the timer to fire after interval seconds."""
+        self._scheduler._schedule(self, monotonic() + interval)
+
+    def cancel(self):
+        self._scheduler._cancel(self)
+
+
+class TimerScheduler(object):
+    """Heap based scheduler running all timer callbacks in a single thread.
+
+    Callbacks are executed in the scheduler thread and therefore must not
+    block, otherwise all other timers are delayed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._heap = []
+        self._counter = itertools.count()  # tie breaker for equal deadlines
+        self._thread = None
+
+    def create_timer(self, callback):
+        return Timer(self, callback)
+
+    def _schedule(self, timer, deadline):
+        with self._lock:
+            timer._deadline = deadline
+            entry = timer._entry
+            if entry is not None and entry[0] <= deadline:
+                return  # entry fires first, the new deadline is picked up then
+            self._push(timer, deadline)
+            if self._heap[0] is timer._entry:
+                self._condition.notify()  # new earliest deadline
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='machinetalk-timers'
+                )
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _cancel(self, timer):
+        with self._lock:
+            timer._deadline = None  # heap entry is discarded when due
+
+    def _push(self, timer, deadline):
+        entry = (deadline, next(self._counter), timer)
+        timer._entry = entry
+        heapq.heappush(self._heap, entry)
+
+    def _run(self):
+        heap = self._heap
+        with self._lock:
+            while True:
+                if not heap:
+                    self._condition.wait()
+                    continue
+                now = monotonic()
+                entry = heap[0]
+                if entry[0] > now:
+                    self._condition.wait(entry[0] - now)
+                    continue
+
+                heapq.heappop(heap)
+                timer = entry[2]
+                if timer._entry is not entry:
+                    continue  # stale entry
+                timer._entry = None
+                if timer._deadline is None:
+                    continue  # cancelled
+                if timer._deadline > now:  # restarted since it was queued
+                    self._push(timer, timer._deadline)
+                    continue
+
+                timer._deadline = None
+                self._lock.release()
+                try:
+                    timer._callback()
+                except Exception:
+                    sys.stderr.write('Error: exception in timer callback\n')
+                    traceback.print_exc()
+                finally:
+                    self._lock.acquire()
+
+
+_timer_scheduler = None
+_timer_scheduler_lock = threading.Lock()
+
+
+def get_timer_scheduler():
+    """Returns the process-wide timer scheduler shared by all channels."""
+    global _timer_scheduler
+    with _timer_scheduler_lock:
+        if _timer_scheduler is None:
+            _timer_scheduler = TimerScheduler()
+        return _timer_scheduler
@@ -0,0 +1,82 @@
+# coding=utf-8
+import logging
+import threading
+from collections import deque, namedtuple
+from time import time
+
+logger = logging.getLogger('pymachinetalk')
+
+TraceEvent = namedtuple(
+    'TraceEvent', ['timestamp', 'source', 'kind', 'name', 'message']
+)
+
+
+# Tracers are callables invoked as tracer(source, kind, name, message=None):
+# source is the debugname of the object, kind one of 'state', 'event', 'send',
+# 'receive', 'heartbeat' or 'error'. message is a protobuf message that is
+# only valid for the duration of the call.
+
+
+class PrintTracer(object):
+    """Prints trace events to stdout, replaces the former debug output."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose  # also print message contents
+
+    def __call__(self, source, kind, name, message=None):
+        print('[%s]: %s %s' % (source, kind, name))
+        if self.verbose and message is not None:
+            print(message)
+
+
+class RingBufferTracer(object):
+    """Keeps the latest trace events in memory for later inspection."""
+
+    def __init__(self, capacity=1000, keep_messages=False):
+        self._events = deque(maxlen=capacity)
+        self.keep_messages = keep_messages  # stores messages as text, slow
+
+    def __call__(self, source, kind, name, message=None):
+        if message is not None and self.keep_messages:
+            message = str(message)
+        else:
+            message = None
+        self._events.append(TraceEvent(time(), source, kind, name, message))
+
+    def events(self):
+        return list(self._events)
+
+    def clear(self):
+        self._events.clear()
+
+
+class LoggingTracer(object):
+    """Forwards trace events to a logger."""
+
+    def __init__(self, logger=logger, level=logging.DEBUG):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, source, kind, name, message=None):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, '[%s]: %s %s', source, kind, name)
+
+
+_default_tracer = None
+_default_tracer_lock = threading.Lock()
+
+
+def get_tracer(debuglevel=0):
+    """Returns the tracer for a new object, None disables tracing."""
+    if _default_tracer is not None:
+        return _default_tracer
+    if debuglevel > 0:
+        return PrintTracer(verbose=debuglevel > 1)
+    return None
+
+
+def set_default_tracer(tracer):
+    """Sets the tracer used by all objects created afterwards."""
+    global _default_tracer
+    with _default_tracer_lock:
+        _default_tracer = tracer
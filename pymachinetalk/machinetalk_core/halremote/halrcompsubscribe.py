@@ -7,6 +7,11 @@ from fysom import Fysom
 
 import machinetalk.protobuf.types_pb2 as pb
 from machinetalk.protobuf.message_pb2 import Container
+from ..common.codec import get_default_codec
+from ..common.metrics import perf_counter_ns
+from ..common.reactor import get_default_reactor
+from ..common.timerscheduler import get_timer_scheduler
+from ..common.trace import get_tracer, logger
 
 
 class HalrcompSubscribe(object):
@@ -16,26 +21,50 @@ class HalrcompSubscribe(object):
         self._error_string = ''
         self.on_error_string_changed = []
         # ZeroMQ
-        context = zmq.Context()
-        context.linger = 0
+        self._reactor = get_default_reactor()  # None for a socket worker thread
+        if self._reactor is not None:
+            context = self._reactor.context  # shared process-wide context
+        else:
+            context = zmq.Context()
+            context.linger = 0
+            # pipe to signalize a shutdown
+            self._shutdown = context.socket(zmq.PUSH)
+            self._shutdown_uri = b'inproc://shutdown-%s' % str(uuid.uuid4()).encode()
+            self._shutdown.bind(self._shutdown_uri)
+            # pipe for subscription changes of the running socket
+            self._subscription_pipe = context.socket(zmq.PUSH)
+            self._subscription_pipe_uri = (
+                b'inproc://subscription-%s' % str(uuid.uuid4()).encode()
+            )
+            self._subscription_pipe.bind(self._subscription_pipe_uri)
         self._context = context
-        # pipe to signalize a shutdown
-        self._shutdown = context.socket(zmq.PUSH)
-        self._shutdown_uri = b'inproc://shutdown-%s' % str(uuid.uuid4()).encode()
-        self._shutdown.bind(self._shutdown_uri)
         self._thread = None  # socket worker tread
+        self._socket = None  # socket owned by the reactor thread
+        self._socket_subscribed = set()  # topics subscribed on the reactor socket
         self._tx_lock = threading.Lock()  # lock for outgoing messages
 
         # Socket
         self.socket_uri = ''
         self._socket_topics = set()
+        self._socket_topic_cache = {}  # raw topic -> decoded subscribed topic
+        # receive frames without copying, pays off for large messages only
+        self.socket_zero_copy = False
+        self._codec = get_default_codec()
+        self.metrics = None  # ChannelMetrics when instrumentation is enabled
         # more efficient to reuse protobuf messages
         self._socket_rx = Container()
+        # receive batching, drain up to batch size messages per wakeup
+        self.socket_batch_size = 64
+        self.socket_batch_count = 0  # number of wakeups with messages
+        self.socket_message_count = 0  # number of handled messages
+        self.socket_max_batch_size = 0  # largest batch seen
 
         # Heartbeat
         self._heartbeat_lock = threading.Lock()
         self._heartbeat_interval = 2500
-        self._heartbeat_timer = None
+        # the reactor decides where timers run, e.g. in an asyncio loop
+        timers = self._reactor if self._reactor is not None else get_timer_scheduler()
+        self._heartbeat_timer = timers.create_timer(self._heartbeat_timer_tick)
         self._heartbeat_active = False
         self._heartbeat_liveness = 0
         self._heartbeat_reset_liveness = 5
@@ -70,64 +99,75 @@ class HalrcompSubscribe(object):
         self._fsm.onafterheartbeat_tick = self._on_fsm_heartbeat_tick
         self._fsm.onafterany_msg_received = self._on_fsm_any_msg_received
 
+    @property
+    def debuglevel(self):
+        return self._debuglevel
+
+    @debuglevel.setter
+    def debuglevel(self, debuglevel):
+        self._debuglevel = debuglevel
+        self.tracer = get_tracer(debuglevel)  # None when tracing is disabled
+
     def _on_fsm_down(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state DOWN' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'DOWN')
         for cb in self.on_state_changed:
             cb('down')
         return True
 
     def _on_fsm_start(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event START' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'START')
         self.start_socket()
         return True
 
     def _on_fsm_trying(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state TRYING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'TRYING')
         for cb in self.on_state_changed:
             cb('trying')
         return True
 
     def _on_fsm_full_update_received(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event FULL UPDATE RECEIVED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'FULL UPDATE RECEIVED')
         self.reset_heartbeat_liveness()
         self.start_heartbeat_timer()
         return True
 
     def _on_fsm_stop(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event STOP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'STOP')
         self.stop_heartbeat_timer()
         self.stop_socket()
         return True
 
     def _on_fsm_up(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state UP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'UP')
         for cb in self.on_state_changed:
             cb('up')
         return True
 
     def _on_fsm_heartbeat_timeout(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HEARTBEAT TIMEOUT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HEARTBEAT TIMEOUT')
+        if self.metrics is not None:
+            self.metrics.reconnects += 1
         self.stop_heartbeat_timer()
         self.stop_socket()
         self.start_socket()
         return True
 
     def _on_fsm_heartbeat_tick(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HEARTBEAT TICK' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HEARTBEAT TICK')
         self.reset_heartbeat_timer()
         return True
 
     def _on_fsm_any_msg_received(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event ANY MSG RECEIVED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'ANY MSG RECEIVED')
         self.reset_heartbeat_liveness()
         self.reset_heartbeat_timer()
         return True
@@ -154,6 +194,19 @@ class HalrcompSubscribe(object):
         elif self._fsm.isstate('up'):
             self._fsm.stop()
 
+    def close(self):
+        """Stops the channel and releases its sockets, it cannot be restarted.
+
+        Without a reactor the channel owns a context, which deadlocks when it
+        is left to the garbage collector. Must not be called from a callback.
+        """
+        self.stop()
+        if self._reactor is not None:
+            return
+        if self._thread is not None:
+            self._thread.join()
+        self._context.destroy(linger=0)
+
     def add_socket_topic(self, name):
         self._socket_topics.add(name)
 
@@ -163,29 +216,84 @@ class HalrcompSubscribe(object):
     def clear_socket_topics(self):
         self._socket_topics.clear()
 
+    def subscribe_socket_topic(self, name):
+        """Adds a topic and subscribes it on the running socket.
+
+        A topic that is already subscribed is subscribed again, the
+        publisher answers with a fresh full update in both cases.
+        """
+        with self._tx_lock:
+            self._socket_topics.add(name)
+            self._send_subscription(zmq.SUBSCRIBE, name)
+
+    def unsubscribe_socket_topic(self, name):
+        """Removes a topic and unsubscribes it on the running socket."""
+        with self._tx_lock:
+            self._socket_topics.discard(name)
+            self._send_subscription(zmq.UNSUBSCRIBE, name)
+
+    # must be called with the tx lock held
+    def _send_subscription(self, option, name):
+        topic = name.encode()
+        if self._reactor is not None:
+            self._reactor.call(self._update_reactor_subscription, option, topic)
+            return
+        try:
+            self._subscription_pipe.send_multipart(
+                (b'%i' % option, topic), zmq.NOBLOCK
+            )
+        except zmq.Again:
+            pass  # no socket running, subscribed on socket creation instead
+
+    # must be called from the thread owning socket
+    def _update_subscription(self, socket, subscribed, option, topic):
+        if topic in subscribed:
+            # a repeated subscription is not forwarded to the publisher
+            socket.setsockopt(zmq.UNSUBSCRIBE, topic)
+            subscribed.remove(topic)
+        if option == zmq.SUBSCRIBE:
+            socket.setsockopt(zmq.SUBSCRIBE, topic)
+            subscribed.add(topic)
+
+    def _subscribe_socket(self, socket):
+        with self._tx_lock:
+            subscribed = {topic.encode() for topic in self._socket_topics}
+        for topic in subscribed:
+            socket.setsockopt(zmq.SUBSCRIBE, topic)
+        return subscribed
+
     def _socket_worker(self, context, uri):
         poll = zmq.Poller()
+        # registered first, poll results are in registration order
+        shutdown = context.socket(zmq.PULL)
+        shutdown.connect(self._shutdown_uri)
+        poll.register(shutdown, zmq.POLLIN)
+        subscriptions = context.socket(zmq.PULL)
+        subscriptions.connect(self._subscription_pipe_uri)
+        poll.register(subscriptions, zmq.POLLIN)
+
         socket = context.socket(zmq.SUB)
         socket.setsockopt(zmq.LINGER, 0)
         socket.connect(uri)
         poll.register(socket, zmq.POLLIN)
         # subscribe is always connected to socket creation
-        for topic in self._socket_topics:
-            socket.setsockopt(zmq.SUBSCRIBE, topic.encode())
-
-        shutdown = context.socket(zmq.PULL)
-        shutdown.connect(self._shutdown_uri)
-        poll.register(shutdown, zmq.POLLIN)
+        subscribed = self._subscribe_socket(socket)
 
         while True:
-            s = dict(poll.poll())
-            if shutdown in s:
-                shutdown.recv()
-                return  # shutdown signal
-            if socket in s:
-                self._socket_message_received(socket)
+            for ready, _ in poll.poll():
+                if ready is shutdown:
+                    shutdown.recv()
+                    return  # shutdown signal
+                elif ready is subscriptions:
+                    option, topic = subscriptions.recv_multipart()
+                    self._update_subscription(socket, subscribed, int(option), topic)
+                else:
+                    self._socket_readable(socket)
 
     def start_socket(self):
+        if self._reactor is not None:
+            self._reactor.call(self._start_reactor_socket, self.socket_uri)
+            return
         self._thread = threading.Thread(
             target=self._socket_worker,
             args=(
@@ -196,17 +304,40 @@ class HalrcompSubscribe(object):
         self._thread.start()
 
     def stop_socket(self):
+        if self._reactor is not None:
+            self._reactor.call(self._stop_reactor_socket)
+            return
         self._shutdown.send(b' ')  # trigger socket thread shutdown
-        self._thread = None
 
-    def _heartbeat_timer_tick(self):
-        with self._heartbeat_lock:
-            self._heartbeat_timer = None  # timer is dead on tick
+    def _start_reactor_socket(self, uri):
+        socket = self._context.socket(zmq.SUB)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(uri)
+        # subscribe is always connected to socket creation
+        self._socket_subscribed = self._subscribe_socket(socket)
+        self._socket = socket
+        self._reactor.add_socket(socket, self._socket_readable)
+
+    def _update_reactor_subscription(self, option, topic):
+        if self._socket is not None:
+            self._update_subscription(
+                self._socket, self._socket_subscribed, option, topic
+            )
+
+    def _stop_reactor_socket(self):
+        if self._socket is None:
+            return
+        self._reactor.remove_socket(self._socket)
+        self._socket.close()
+        self._socket = None
 
-        if self.debuglevel > 0:
-            print('[%s] heartbeat timer tick' % self.debugname)
+    def _heartbeat_timer_tick(self):
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'heartbeat', 'tick')
 
         self._heartbeat_liveness -= 1
+        if self.metrics is not None:
+            self.metrics.heartbeat_misses += 1
         if self._heartbeat_liveness == 0:
             if self._fsm.isstate('up'):
                 self._fsm.heartbeat_timeout()
@@ -223,18 +354,13 @@ class HalrcompSubscribe(object):
             return
 
         self._heartbeat_lock.acquire()
-        if self._heartbeat_timer:
-            self._heartbeat_timer.cancel()
-            self._heartbeat_timer = None
-
         if self._heartbeat_interval > 0:
-            self._heartbeat_timer = threading.Timer(
-                self._heartbeat_interval / 1000.0, self._heartbeat_timer_tick
-            )
-            self._heartbeat_timer.start()
+            self._heartbeat_timer.start(self._heartbeat_interval / 1000.0)
+        else:
+            self._heartbeat_timer.cancel()
         self._heartbeat_lock.release()
-        if self.debuglevel > 0:
-            print('[%s] heartbeat timer reset' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'heartbeat', 'reset')
 
     def start_heartbeat_timer(self):
         self._heartbeat_active = True
@@ -243,28 +369,56 @@ class HalrcompSubscribe(object):
     def stop_heartbeat_timer(self):
         self._heartbeat_active = False
         self._heartbeat_lock.acquire()
-        if self._heartbeat_timer:
-            self._heartbeat_timer.cancel()
-            self._heartbeat_timer = None
+        self._heartbeat_timer.cancel()
         self._heartbeat_lock.release()
 
+    def _socket_readable(self, socket):
+        # drain all pending messages up to the batch size before polling again
+        count = 0
+        while True:
+            self._socket_message_received(socket)
+            count += 1
+            if count >= self.socket_batch_size:
+                break
+            if not socket.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+                break
+        self.socket_batch_count += 1
+        self.socket_message_count += count
+        if count > self.socket_max_batch_size:
+            self.socket_max_batch_size = count
+        if self.metrics is not None:
+            self.metrics.batch_size.record(count)
+
     # process all messages received on socket
     def _socket_message_received(self, socket):
-        (identity, msg) = socket.recv_multipart()  # identity is topic
-        identity = identity.decode()
-
+        if self.socket_zero_copy:
+            (topic, frame) = socket.recv_multipart(copy=False)  # identity is topic
+            topic = topic.bytes
+            msg = frame.buffer  # parsed straight from the frame memory
+        else:
+            (topic, msg) = socket.recv_multipart()  # identity is topic
+        identity = self._socket_topic_cache.get(topic)
+        if identity is None:
+            identity = topic.decode()
+            if identity in self._socket_topics:
+                self._socket_topic_cache[topic] = identity
+
+        metrics = self.metrics
+        if metrics is not None:
+            start = perf_counter_ns()
         try:
-            self._socket_rx.ParseFromString(msg)
+            rx = self._codec.decode(msg, self._socket_rx)
         except DecodeError as e:
             note = 'Protobuf Decode Error: ' + str(e)
-            print(note)  # TODO: decode error
+            logger.warning('[%s] %s', self.debugname, note)
+            if self.tracer is not None:
+                self.tracer(self.debugname, 'error', note)
             return
+        if metrics is not None:
+            metrics.message_received(len(msg), perf_counter_ns() - start)
 
-        if self.debuglevel > 0:
-            print('[%s] received message' % self.debugname)
-            if self.debuglevel > 1:
-                print(self._socket_rx)
-        rx = self._socket_rx
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'receive', rx.type, rx)
 
         # react to any incoming message
         if self._fsm.isstate('up'):
@@ -282,5 +436,9 @@ class HalrcompSubscribe(object):
             if self._fsm.isstate('trying'):
                 self._fsm.full_update_received()
 
+        if metrics is not None:
+            start = perf_counter_ns()
         for cb in self.on_socket_message_received:
             cb(identity, rx)
+        if metrics is not None:
+            metrics.callback_ns.record(perf_counter_ns() - start)
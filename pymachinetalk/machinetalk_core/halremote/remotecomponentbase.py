@@ -2,6 +2,7 @@
 from fysom import Fysom
 from ..common.rpcclient import RpcClient
 from ..halremote.halrcompsubscribe import HalrcompSubscribe
+from ..common.trace import get_tracer
 
 import machinetalk.protobuf.types_pb2 as pb
 from machinetalk.protobuf.message_pb2 import Container
@@ -97,158 +98,167 @@ class RemoteComponentBase(object):
         self._fsm.onafterhalrcomp_set_msg_sent = self._on_fsm_halrcomp_set_msg_sent
         self._fsm.onerror = self._on_fsm_error
 
+    @property
+    def debuglevel(self):
+        return self._debuglevel
+
+    @debuglevel.setter
+    def debuglevel(self, debuglevel):
+        self._debuglevel = debuglevel
+        self.tracer = get_tracer(debuglevel)  # None when tracing is disabled
+
     def _on_fsm_down(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state DOWN entry' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'DOWN entry')
         self.set_disconnected()
-        if self.debuglevel > 0:
-            print('[%s]: state DOWN' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'DOWN')
         for cb in self.on_state_changed:
             cb('down')
         return True
 
     def _on_fsm_connect(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event CONNECT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'CONNECT')
         self.add_pins()
         self.start_halrcmd_channel()
         return True
 
     def _on_fsm_down_exit(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state DOWN exit' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'DOWN exit')
         self.set_connecting()
         return True
 
     def _on_fsm_trying(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state TRYING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'TRYING')
         for cb in self.on_state_changed:
             cb('trying')
         return True
 
     def _on_fsm_halrcmd_up(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HALRCMD UP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HALRCMD UP')
         self.bind_component()
         return True
 
     def _on_fsm_disconnect(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event DISCONNECT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'DISCONNECT')
         self.stop_halrcmd_channel()
         self.stop_halrcomp_channel()
         self.remove_pins()
         return True
 
     def _on_fsm_bind(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state BIND' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'BIND')
         for cb in self.on_state_changed:
             cb('bind')
         return True
 
     def _on_fsm_halrcomp_bind_msg_sent(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HALRCOMP BIND MSG SENT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HALRCOMP BIND MSG SENT')
         return True
 
     def _on_fsm_no_bind(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event NO BIND' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'NO BIND')
         self.start_halrcomp_channel()
         return True
 
     def _on_fsm_binding(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state BINDING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'BINDING')
         for cb in self.on_state_changed:
             cb('binding')
         return True
 
     def _on_fsm_bind_confirmed(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event BIND CONFIRMED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'BIND CONFIRMED')
         self.start_halrcomp_channel()
         return True
 
     def _on_fsm_bind_rejected(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event BIND REJECTED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'BIND REJECTED')
         self.stop_halrcmd_channel()
         return True
 
     def _on_fsm_halrcmd_trying(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HALRCMD TRYING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HALRCMD TRYING')
         return True
 
     def _on_fsm_syncing(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state SYNCING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'SYNCING')
         for cb in self.on_state_changed:
             cb('syncing')
         return True
 
     def _on_fsm_halrcomp_up(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HALRCOMP UP' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HALRCOMP UP')
         return True
 
     def _on_fsm_sync_failed(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event SYNC FAILED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'SYNC FAILED')
         self.stop_halrcomp_channel()
         self.stop_halrcmd_channel()
         return True
 
     def _on_fsm_sync(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state SYNC' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'SYNC')
         for cb in self.on_state_changed:
             cb('sync')
         return True
 
     def _on_fsm_pins_synced(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event PINS SYNCED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'PINS SYNCED')
         return True
 
     def _on_fsm_synced(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state SYNCED entry' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'SYNCED entry')
         self.set_connected()
-        if self.debuglevel > 0:
-            print('[%s]: state SYNCED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'SYNCED')
         for cb in self.on_state_changed:
             cb('synced')
         return True
 
     def _on_fsm_halrcomp_trying(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HALRCOMP TRYING' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HALRCOMP TRYING')
         self.unsync_pins()
         self.set_timeout()
         return True
 
     def _on_fsm_set_rejected(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event SET REJECTED' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'SET REJECTED')
         self.stop_halrcomp_channel()
         self.stop_halrcmd_channel()
         return True
 
     def _on_fsm_halrcomp_set_msg_sent(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: event HALRCOMP SET MSG SENT' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'event', 'HALRCOMP SET MSG SENT')
         return True
 
     def _on_fsm_error(self, _):
-        if self.debuglevel > 0:
-            print('[%s]: state ERROR entry' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'ERROR entry')
         self.set_error()
-        if self.debuglevel > 0:
-            print('[%s]: state ERROR' % self.debugname)
+        if self.tracer is not None:
+            self.tracer(self.debugname, 'state', 'ERROR')
         for cb in self.on_state_changed:
             cb('error')
         return True
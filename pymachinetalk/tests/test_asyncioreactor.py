@@ -0,0 +1,154 @@
+# coding=utf-8
+import asyncio
+import threading
+
+import pytest
+import zmq
+import zmq.asyncio
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture
+def asyncio_reactor(loop):
+    from pymachinetalk.machinetalk_core.common import reactor as reactor_module
+    from pymachinetalk.machinetalk_core.common.asyncioreactor import (
+        use_asyncio_reactor,
+    )
+
+    reactor = use_asyncio_reactor(loop)
+    yield reactor
+    reactor_module.set_default_reactor(None)
+    reactor.stop()
+
+
+def test_rpc_client_runs_in_event_loop(loop, asyncio_reactor):
+    from pymachinetalk.machinetalk_core.common.rpcclient import RpcClient
+    import machinetalk.protobuf.types_pb2 as pb
+    from machinetalk.protobuf.message_pb2 import Container
+
+    context = zmq.asyncio.Context()
+    server = context.socket(zmq.ROUTER)
+    port = server.bind_to_random_port('tcp://127.0.0.1')
+    client = RpcClient()
+    client.socket_uri = 'tcp://127.0.0.1:%i' % port
+    threads = threading.active_count()
+    states = []
+    client.on_state_changed.append(states.append)
+
+    async def serve():
+        identity, data = await server.recv_multipart()
+        rx = Container()
+        rx.ParseFromString(data)
+        assert rx.type == pb.MT_PING
+        tx = Container()
+        tx.type = pb.MT_PING_ACKNOWLEDGE
+        await server.send_multipart([identity, tx.SerializeToString()])
+        while 'up' not in states:
+            await asyncio.sleep(0.01)
+
+    client.start()
+    loop.run_until_complete(asyncio.wait_for(serve(), 2.0))
+
+    assert 'up' in states
+    assert threading.active_count() == threads
+    client.stop()
+    loop.run_until_complete(asyncio.sleep(0.01))
+    server.close()
+    context.term()
+
+
+def test_wait_connected_async_resolves_from_other_thread(loop, reactor):
+    from pymachinetalk.halremote import RemoteComponent
+
+    rcomp = RemoteComponent('test')
+
+    async def wait():
+        return await rcomp.wait_connected_async(timeout=2.0)
+
+    threading.Timer(0.05, rcomp.set_connected).start()
+
+    assert loop.run_until_complete(wait())
+
+
+def test_wait_completed_async_times_out(loop, reactor):
+    from pymachinetalk.application import ApplicationCommand
+
+    command = ApplicationCommand()
+    command.ticket = 5
+
+    async def wait():
+        return await command.wait_completed_async(timeout=0.05)
+
+    assert not loop.run_until_complete(wait())
+
+
+def test_coalesced_status_updates_are_published_in_event_loop(
+    loop, asyncio_reactor, mocker
+):
+    from pymachinetalk.application import ApplicationStatus
+    from machinetalk.protobuf.message_pb2 import Container
+
+    status = ApplicationStatus()
+    status.coalesce_interval = 0.01
+    published = []
+    mocker.patch.object(
+        status.motion_condition,
+        'notify',
+        side_effect=lambda: published.append(asyncio_reactor.in_reactor_thread()),
+    )
+    motion = Container().emc_status_motion
+    motion.current_vel = 1.0
+
+    status._update_motion_object(motion)
+    loop.run_until_complete(asyncio.sleep(0.1))
+
+    assert published == [True]
+
+
+def test_auto_flush_sends_from_event_loop(loop, asyncio_reactor, mocker):
+    from pymachinetalk import halremote
+
+    rcomp = halremote.RemoteComponent('test')
+    sent = []
+    mocker.patch.object(
+        rcomp,
+        'send_halrcomp_set',
+        side_effect=lambda tx: sent.append(asyncio_reactor.in_reactor_thread()),
+    )
+    pin = rcomp.newpin('out', halremote.HAL_FLOAT, halremote.HAL_OUT)
+    pin.handle = 1
+    rcomp.set_connected()
+    rcomp.auto_flush_interval = 0.01
+
+    rcomp['out'] = 1.0
+    loop.run_until_complete(asyncio.sleep(0.1))
+
+    assert sent == [True]
+
+
+def test_jog_streamer_ticks_in_event_loop(loop, asyncio_reactor, mocker):
+    from pymachinetalk.application import ApplicationCommand, JogStreamer
+
+    command = ApplicationCommand()
+    command.connected = True
+    ticks = []
+    mocker.patch.object(
+        command,
+        'send_command_message',
+        side_effect=lambda *args, **kwargs: ticks.append(
+            asyncio_reactor.in_reactor_thread()
+        ),
+    )
+    streamer = JogStreamer(command, rate=100.0)
+
+    streamer.jog(0, 1.0)
+    loop.run_until_complete(asyncio.sleep(0.05))
+    streamer.close()
+
+    assert ticks and all(ticks)
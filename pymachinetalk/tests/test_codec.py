@@ -0,0 +1,87 @@
+# coding=utf-8
+import pytest
+
+
+@pytest.fixture
+def codec():
+    from pymachinetalk.machinetalk_core.common import codec
+
+    return codec
+
+
+@pytest.fixture
+def container():
+    from machinetalk.protobuf.message_pb2 import Container
+
+    return Container
+
+
+def test_protobuf_backend_is_reported(codec):
+    assert codec.protobuf_backend() in ('python', 'upb', 'cpp')
+
+
+def test_peek_type_finds_type_after_other_fields(codec, container):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    tx = container()
+    tx.note.append('foo')
+    tx.type = pb.MT_HALRCOMP_FULL_UPDATE
+    tx.serial = 5
+
+    data = tx.SerializeToString()
+
+    assert codec.peek_type(data) == pb.MT_HALRCOMP_FULL_UPDATE
+    assert codec.peek_type(memoryview(data)) == pb.MT_HALRCOMP_FULL_UPDATE
+    assert codec.peek_type(b'') is None
+    assert codec.peek_type(b'\x08') is None  # truncated
+    assert codec.peek_type(container(type=pb.MT_PING).SerializeToString()) == pb.MT_PING
+
+
+def test_lazy_codec_skips_parsing_pings(codec, container):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    tx = container()
+    tx.type = pb.MT_PING
+    rx = container()
+    rx.note.append('stale')
+
+    decoded = codec.LazyCodec().decode(tx.SerializeToString(), rx)
+
+    assert decoded == container(type=pb.MT_PING)
+    assert decoded is not rx
+    assert list(rx.note) == ['stale']
+
+
+def test_lazy_codec_parses_pings_with_parameters(codec, container):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    tx = container()
+    tx.type = pb.MT_PING
+    tx.pparams.keepalive_timer = 500
+    rx = container()
+
+    decoded = codec.LazyCodec().decode(tx.SerializeToString(), rx)
+
+    assert decoded is rx
+    assert rx.pparams.keepalive_timer == 500
+    assert codec.bare_type(tx.SerializeToString()) is None
+
+
+def test_lazy_codec_parses_other_messages(codec, container):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    tx = container()
+    tx.type = pb.MT_EMCSTAT_FULL_UPDATE
+    tx.emc_status_motion.current_vel = 1.0
+    rx = container()
+
+    assert codec.LazyCodec().decode(tx.SerializeToString(), rx) is rx
+    assert rx == tx
+
+
+def test_pure_python_backend_warns(codec, mocker):
+    mocker.patch.object(codec, '_default_codec', None)
+    mocker.patch.object(codec, 'protobuf_backend', return_value='python')
+
+    with pytest.warns(RuntimeWarning):
+        codec.get_default_codec()
@@ -0,0 +1,149 @@
+# coding=utf-8
+import pytest
+
+
+@pytest.fixture
+def common():
+    from pymachinetalk import common
+
+    return common
+
+
+@pytest.fixture
+def container():
+    from machinetalk.protobuf.message_pb2 import Container
+
+    return Container()
+
+
+@pytest.fixture
+def motion(common, container):
+    obj = common.MessageObject()
+    common.recurse_descriptor(container.emc_status_motion.DESCRIPTOR, obj)
+    return obj
+
+
+def test_recurse_message_updates_scalar_and_nested_fields(common, container, motion):
+    msg = container.emc_status_motion
+    msg.current_vel = 2.5
+    msg.position.x = 1.0
+
+    common.recurse_message(msg, motion)
+
+    assert motion.current_vel == 2.5
+    assert motion.position.x == 1.0
+    assert motion.position.y == 0.0
+
+
+def test_recurse_message_leaves_absent_fields_untouched(common, container, motion):
+    motion.current_vel = 3.0
+    msg = container.emc_status_motion
+    msg.position.y = 1.0
+
+    common.recurse_message(msg, motion)
+
+    assert motion.current_vel == 3.0
+    assert motion.position.y == 1.0
+
+
+def test_recurse_message_grows_repeated_messages(common, container, motion):
+    msg = container.emc_status_motion
+    axis = msg.axis.add()
+    axis.index = 2
+    axis.homed = True
+
+    common.recurse_message(msg, motion)
+
+    assert len(motion.axis) == 3
+    assert motion.axis[2].homed is True
+    assert motion.axis[1].homed is False
+
+
+def test_recurse_message_stores_index_value_pairs_as_list(common, container):
+    config = common.MessageObject()
+    common.recurse_descriptor(container.emc_status_config.DESCRIPTOR, config)
+    msg = container.emc_status_config
+    extension = msg.program_extension.add()
+    extension.index = 1
+    extension.extension = '.ngc'
+
+    common.recurse_message(msg, config)
+
+    assert config.program_extension[1] == '.ngc'
+
+
+def test_recurse_message_applies_field_filter(common, container, motion):
+    msg = container.emc_status_motion
+    msg.current_vel = 2.5
+    msg.feedrate = 0.5
+
+    common.recurse_message(msg, motion, field_filter='feedrate')
+
+    assert motion.feedrate == 0.5
+    assert motion.current_vel == 0.0
+
+
+def test_message_class_uses_slots_and_shared_id_map(common, container):
+    cls = common.message_class(container.emc_status_motion.DESCRIPTOR)
+
+    first = cls()
+    second = cls()
+
+    assert not hasattr(first, '__dict__')
+    assert first.id_map is second.id_map
+    assert first.id_map[32] == 'position'
+    assert cls is common.message_class(container.emc_status_motion.DESCRIPTOR)
+
+
+def test_message_class_initializes_defaults(common, container):
+    motion = common.message_class(container.emc_status_motion.DESCRIPTOR)()
+
+    assert motion.current_vel == 0.0
+    assert motion.position.x == 0.0
+    assert motion.position[0] == 0.0
+    assert motion.axis[0].homed is False
+    assert motion.din == [False]
+    assert motion.axis[0] is not type(motion)().axis[0]
+
+
+def test_recurse_message_updates_message_class_objects(common, container):
+    motion = common.message_class(container.emc_status_motion.DESCRIPTOR)()
+    msg = container.emc_status_motion
+    msg.position.z = 3.0
+    axis = msg.axis.add()
+    axis.index = 1
+    axis.homed = True
+
+    common.recurse_message(msg, motion)
+
+    assert motion.position.z == 3.0
+    assert motion.axis[1].homed is True
+
+
+def test_recurse_message_returns_touched_watches(common, container, motion):
+    msg = container.emc_status_motion
+    watches = common.FieldWatch()
+    watches.add(msg.DESCRIPTOR, 'position.x', print)
+    watches.add(msg.DESCRIPTOR, 'current_vel', print)
+    msg.position.x = 1.0
+    msg.position.y = 2.0
+
+    fired = common.recurse_message(msg, motion, watches=watches)
+
+    assert [node.names for node in fired] == [('position', 'x')]
+    assert fired[0].value(motion) == 1.0
+
+
+def test_snapshot_object_copies_changed_fields_only(common, container):
+    descriptor = container.emc_status_motion.DESCRIPTOR
+    obj = common.message_class(descriptor)()
+    first = common.snapshot_object(obj, obj.__slots__)
+    obj.position.x = 1.0
+    obj.current_vel = 2.0
+
+    second = common.snapshot_object(obj, ['current_vel'], first)
+
+    assert first.position is not obj.position
+    assert second.position is first.position
+    assert second.position.x == 0.0
+    assert second.current_vel == 2.0
@@ -0,0 +1,370 @@
+# coding=utf-8
+import time
+
+import pytest
+
+
+@pytest.fixture
+def halremote():
+    from pymachinetalk import halremote
+
+    return halremote
+
+
+@pytest.fixture
+def rcomp(halremote, reactor, mocker):
+    rcomp = halremote.RemoteComponent('test')
+    rcomp.sent = []
+
+    def send_halrcomp_set(tx):
+        rcomp.sent.append([(pin.handle, pin.halfloat) for pin in tx.pin])
+        tx.Clear()
+
+    mocker.patch.object(rcomp, 'send_halrcomp_set', side_effect=send_halrcomp_set)
+    for i in range(3):
+        pin = rcomp.newpin('out%i' % i, halremote.HAL_FLOAT, halremote.HAL_OUT)
+        pin.handle = i + 1
+    rcomp.set_connected()
+    return rcomp
+
+
+def test_pin_change_is_sent_immediately(rcomp):
+    rcomp['out0'] = 1.0
+
+    assert rcomp.sent == [[(1, 1.0)]]
+
+
+def test_batch_sends_single_message_with_latest_values(rcomp):
+    with rcomp.batch():
+        for i in range(3):
+            rcomp['out%i' % i] = 1.0
+        rcomp['out0'] = 2.0
+        assert rcomp.sent == []
+
+    assert rcomp.sent == [[(1, 2.0), (2, 1.0), (3, 1.0)]]
+
+
+def test_auto_flush_merges_changes_within_interval(rcomp):
+    rcomp.auto_flush_interval = 0.02
+
+    rcomp['out0'] = 1.0
+    rcomp['out1'] = 1.0
+    assert rcomp.sent == []
+    time.sleep(0.2)
+
+    assert rcomp.sent == [[(1, 1.0), (2, 1.0)]]
+
+
+def test_pending_changes_are_dropped_on_disconnect(rcomp):
+    with rcomp.batch():
+        rcomp['out0'] = 1.0
+        rcomp.set_disconnected()
+
+    assert rcomp.sent == []
+
+
+def test_pin_values_are_stored_in_typed_arrays(halremote, rcomp):
+    rcomp.newpin('bit', halremote.HAL_BIT, halremote.HAL_OUT)
+    rcomp['out1'] = 2.5
+    rcomp['bit'] = True
+
+    assert list(rcomp.store.values(halremote.HAL_FLOAT)) == [0.0, 2.5, 0.0]
+    assert rcomp.store.names(halremote.HAL_FLOAT) == ['out0', 'out1', 'out2']
+    assert rcomp['bit'] is True
+
+
+def test_set_many_sends_single_message(rcomp):
+    rcomp.set_many({'out0': 1.0, 'out2': 3.0})
+
+    assert rcomp.get_many(['out0', 'out1', 'out2']) == [1.0, 0.0, 3.0]
+    assert rcomp.sent == [[(1, 1.0), (3, 3.0)]]
+
+
+def test_float_view_shares_memory_with_store(rcomp):
+    numpy = pytest.importorskip('numpy')
+
+    view = rcomp.store.float_view()
+    rcomp['out0'] = 1.5
+
+    assert view.dtype == numpy.float64
+    assert view[0] == 1.5
+
+
+def full_update(halremote, rcomp):
+    from machinetalk.protobuf.message_pb2 import Container
+
+    rx = Container()
+    comp = rx.comp.add()
+    comp.name = 'test'
+    for i, (name, pin) in enumerate(rcomp.pinsbyname.items()):
+        rpin = comp.pin.add()
+        rpin.name = 'test.%s' % name
+        rpin.handle = i + 101
+        rpin.type = pin.pintype
+        rpin.halfloat = 0.5
+    rcomp.halrcomp_full_update_received('test', rx)
+
+
+def incremental_update(handle, value):
+    from machinetalk.protobuf.message_pb2 import Container
+
+    rx = Container()
+    rpin = rx.pin.add()
+    rpin.handle = handle
+    rpin.halfloat = value
+    return rx
+
+
+def test_incremental_update_uses_handle_decoders(halremote, rcomp, mocker):
+    full_update(halremote, rcomp)
+    pin_update = mocker.spy(rcomp, 'pin_update')
+    pin = rcomp.getpin('out1')
+    pin.synced = False
+
+    rcomp.halrcomp_incremental_update_received('test', incremental_update(102, 2.5))
+
+    assert pin_update.call_count == 0
+    assert pin.value == 2.5
+    assert pin.synced
+
+
+def test_incremental_update_notifies_watchers(halremote, rcomp):
+    full_update(halremote, rcomp)
+    values = []
+    rcomp.getpin('out0').on_value_changed.append(values.append)
+
+    rcomp.halrcomp_incremental_update_received('test', incremental_update(101, 1.5))
+
+    assert values == [1.5]
+
+
+def test_incremental_update_wakes_waiting_threads(halremote, rcomp):
+    import threading
+
+    full_update(halremote, rcomp)
+    pin = rcomp.getpin('out0')
+    pin.value = 0.0
+    threading.Timer(
+        0.05,
+        rcomp.halrcomp_incremental_update_received,
+        ('test', incremental_update(101, 1.5)),
+    ).start()
+
+    assert pin.wait_value(timeout=2.0) == 1.5
+
+
+def test_concurrent_flushes_send_separate_messages(rcomp):
+    import threading
+
+    rcomp.auto_flush_interval = 60.0  # only flushed explicitly
+    send = rcomp.send_halrcomp_set.side_effect
+    sent = []
+
+    def send_halrcomp_set(tx):
+        if not sent:  # a second flush runs while the first one is sending
+            sent.append(None)
+            rcomp['out1'] = 2.0
+            flush = threading.Thread(target=rcomp.flush)
+            flush.start()
+            flush.join()
+        send(tx)
+
+    rcomp.send_halrcomp_set.side_effect = send_halrcomp_set
+    rcomp['out0'] = 1.0
+    rcomp.flush()
+    rcomp._flush_timer.cancel()
+
+    assert rcomp.sent == [[(2, 2.0)], [(1, 1.0)]]
+
+
+def test_update_between_wait_check_and_sleep_is_not_lost(halremote):
+    import threading
+
+    pin = halremote.Pin()
+    pin.pintype = halremote.HAL_FLOAT
+    pin._value = 0.0
+    get_value = pin._get_value
+    updater = threading.Thread(target=pin._update, args=(1.5,))
+
+    def racing_get_value():
+        value = get_value()
+        if updater.ident is None:
+            updater.start()  # update lands right after the waiter checked
+            time.sleep(0.05)
+        return value
+
+    pin._get_value = racing_get_value
+    start = time.monotonic()
+
+    assert pin.wait_value(timeout=2.0) == 1.5
+    assert time.monotonic() - start < 1.0
+    updater.join()
+
+
+def test_full_update_maps_remote_names_to_pins(halremote, rcomp):
+    full_update(halremote, rcomp)
+
+    assert rcomp.pinsbyhandle[102] is rcomp.getpin('out1')
+    assert rcomp.getpin('out1').handle == 102
+    assert rcomp['out1'] == 0.5
+
+
+def test_resync_skips_unchanged_handles(halremote, rcomp, mocker):
+    full_update(halremote, rcomp)
+    index = mocker.spy(rcomp, '_remote_pin_index')
+
+    full_update(halremote, rcomp)
+
+    assert index.call_count == 0
+
+
+@pytest.fixture
+def haltalk():
+    import zmq
+
+    context = zmq.Context()
+    context.linger = 0
+    halrcmd = context.socket(zmq.ROUTER)
+    halrcomp = context.socket(zmq.XPUB)
+    halrcmd_port = halrcmd.bind_to_random_port('tcp://127.0.0.1')
+    halrcomp_port = halrcomp.bind_to_random_port('tcp://127.0.0.1')
+    yield (
+        halrcmd,
+        halrcomp,
+        'tcp://127.0.0.1:%i' % halrcmd_port,
+        'tcp://127.0.0.1:%i' % halrcomp_port,
+    )
+    halrcmd.close()
+    halrcomp.close()
+    context.term()
+
+
+def serve_haltalk(halremote, haltalk, components, until, timeout=5.0):
+    """Minimal halrcmd/halrcomp server answering pings and binds."""
+    import zmq
+    from machinetalk.protobuf.message_pb2 import Container
+
+    halrcmd, halrcomp = haltalk[:2]
+    poller = zmq.Poller()
+    poller.register(halrcmd, zmq.POLLIN)
+    poller.register(halrcomp, zmq.POLLIN)
+    received = []
+    deadline = time.monotonic() + timeout
+    while not until(received) and time.monotonic() < deadline:
+        for socket, _ in poller.poll(10):
+            if socket is halrcomp:
+                subscription = halrcomp.recv()
+                if subscription[0] == 0:
+                    continue  # unsubscribe
+                topic = subscription[1:].decode()
+                tx = Container()
+                tx.type = halremote.pb.MT_HALRCOMP_FULL_UPDATE
+                comp = tx.comp.add()
+                comp.name = topic
+                for i, name in enumerate(components[topic].pinsbyname):
+                    rpin = comp.pin.add()
+                    rpin.name = '%s.%s' % (topic, name)
+                    rpin.handle = ord(topic) * 10 + i
+                    rpin.halfloat = 1.0
+                halrcomp.send_multipart([topic.encode(), tx.SerializeToString()])
+                continue
+
+            identity, data = halrcmd.recv_multipart()
+            rx = Container()
+            rx.ParseFromString(data)
+            received.append(rx)
+            tx = Container()
+            if rx.type == halremote.pb.MT_PING:
+                tx.type = halremote.pb.MT_PING_ACKNOWLEDGE
+            elif rx.type == halremote.pb.MT_HALRCOMP_BIND:
+                tx.type = halremote.pb.MT_HALRCOMP_BIND_CONFIRM
+            else:
+                continue
+            halrcmd.send_multipart([identity, tx.SerializeToString()])
+    return received
+
+
+def add_components(halremote, session, haltalk, names):
+    components = {}
+    for name in names:
+        rcomp = session.add_component(halremote.RemoteComponent(name))
+        rcomp.newpin('out', halremote.HAL_FLOAT, halremote.HAL_OUT)
+        components[name] = rcomp
+    session.halrcmd_uri = haltalk[2]
+    session.halrcomp_uri = haltalk[3]
+    return components
+
+
+def test_session_binds_components_over_shared_channels(
+    halremote, haltalk, channel_mode
+):
+    session = halremote.RemoteComponentSession()
+    components = add_components(halremote, session, haltalk, 'ab')
+
+    session.ready = True
+    serve_haltalk(
+        halremote,
+        haltalk,
+        components,
+        lambda _: all(rcomp.connected for rcomp in components.values()),
+    )
+    assert components['a'].connected and components['b'].connected
+    assert components['b']['out'] == 1.0
+
+    components['b']['out'] = 2.0
+    received = serve_haltalk(
+        halremote,
+        haltalk,
+        components,
+        lambda rx: any(msg.type == halremote.pb.MT_HALRCOMP_SET for msg in rx),
+    )
+    assert [msg.pin[0].handle for msg in received if msg.pin] == [
+        components['b'].getpin('out').handle
+    ]
+
+    session.ready = False
+    session.close()
+
+
+def test_session_releases_replaced_channels(halremote, haltalk):
+    import gc
+
+    session = halremote.RemoteComponentSession()
+    components = add_components(halremote, session, haltalk, 'abc')
+    gc.collect()  # deadlocked on the contexts of the replaced channels
+
+    session.ready = True
+    serve_haltalk(
+        halremote,
+        haltalk,
+        components,
+        lambda _: all(rcomp.connected for rcomp in components.values()),
+    )
+    assert all(rcomp.connected for rcomp in components.values())
+
+    session.close()
+    gc.collect()
+
+
+def test_session_component_restart_is_synced_again(halremote, haltalk, channel_mode):
+    session = halremote.RemoteComponentSession()
+    components = add_components(halremote, session, haltalk, 'ab')
+    session.ready = True
+    serve_haltalk(
+        halremote,
+        haltalk,
+        components,
+        lambda _: all(rcomp.connected for rcomp in components.values()),
+    )
+    changes = []
+    components['b'].on_connected_changed.append(changes.append)
+
+    components['a'].stop()
+    components['a'].start()
+    serve_haltalk(halremote, haltalk, components, lambda _: components['a'].connected)
+
+    assert components['a'].connected
+    assert components['b'].connected
+    assert changes == []  # the other components are not disturbed
+
+    session.close()
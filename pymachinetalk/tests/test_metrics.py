@@ -0,0 +1,90 @@
+# coding=utf-8
+import pytest
+
+
+@pytest.fixture
+def metrics():
+    from pymachinetalk.machinetalk_core.common import metrics
+
+    return metrics
+
+
+def test_histogram_is_exact_for_small_values(metrics):
+    histogram = metrics.Histogram(significant_bits=4)
+    for value in range(16):
+        histogram.record(value)
+
+    assert histogram.count == 16
+    assert histogram.min == 0
+    assert histogram.max == 15
+    assert histogram.percentile(50) == 7
+    assert histogram.mean == 7.5
+
+
+def test_histogram_bounds_relative_error(metrics):
+    histogram = metrics.Histogram(significant_bits=4)
+    for value in (1000, 10 ** 6, 10 ** 9):
+        histogram.record(value)
+
+    for percent, value in ((1, 1000), (50, 10 ** 6), (100, 10 ** 9)):
+        bucket = histogram.percentile(percent)
+        assert bucket <= value < bucket * (1 + 2.0 / 8)
+
+
+def test_channel_metrics_summary(metrics):
+    channel = metrics.ChannelMetrics()
+    channel.message_received(100, 2000)
+    channel.message_sent(10)
+
+    summary = channel.summary()
+
+    assert summary['bytes_received'] == 100
+    assert summary['messages_sent'] == 1
+    assert summary['parse_ns']['max'] == 2000
+    assert summary['messages_per_second'] > 0
+
+
+def test_command_latency_metrics_record_per_message_type(metrics):
+    from machinetalk.protobuf.types_pb2 import MT_EMC_AXIS_JOG, MT_EMC_TASK_PLAN_RUN
+
+    latency = metrics.CommandLatencyMetrics()
+    latency.command_sent(1, MT_EMC_TASK_PLAN_RUN, 1000)
+    latency.command_sent(2, MT_EMC_AXIS_JOG, 2000)
+    latency.command_sent(3, MT_EMC_AXIS_JOG, 3000)
+
+    latency.command_executed(2, 5000)  # acknowledges ticket 1 too
+    latency.command_completed(1, 9000)
+
+    assert latency.executed_ns['MT_EMC_TASK_PLAN_RUN'].max == 4000
+    assert latency.executed_ns['MT_EMC_AXIS_JOG'].count == 1
+    assert latency.completed_ns['MT_EMC_TASK_PLAN_RUN'].max == 8000
+    assert 'MT_EMC_AXIS_JOG' not in latency.completed_ns
+    summary = latency.summary()
+    assert summary['executed_ns']['MT_EMC_AXIS_JOG']['max'] == 3000
+
+
+def test_command_latency_metrics_bound_pending_tickets(metrics):
+    from machinetalk.protobuf.types_pb2 import MT_EMC_AXIS_JOG
+
+    latency = metrics.CommandLatencyMetrics(max_pending=2)
+    for ticket in range(1, 5):
+        latency.command_sent(ticket, MT_EMC_AXIS_JOG, 0)
+
+    latency.command_executed(4, 100)
+
+    assert latency.executed_ns['MT_EMC_AXIS_JOG'].count == 2
+
+
+def test_perf_counter_ns_fallback_without_native_clock(metrics, monkeypatch):
+    import importlib
+    import time
+
+    monkeypatch.delattr(time, 'perf_counter_ns')
+    try:
+        fallback = importlib.reload(metrics)
+        first = fallback.perf_counter_ns()
+        assert isinstance(first, int)
+        assert fallback.perf_counter_ns() >= first
+    finally:
+        monkeypatch.undo()
+        importlib.reload(metrics)
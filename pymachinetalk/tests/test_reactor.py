@@ -0,0 +1,113 @@
+# coding=utf-8
+import threading
+
+import pytest
+import zmq
+
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    context.linger = 0
+    yield context
+    context.term()
+
+
+def test_call_is_executed_in_reactor_thread(reactor):
+    event = threading.Event()
+    threads = []
+
+    def callback():
+        threads.append(reactor.in_reactor_thread())
+        event.set()
+
+    reactor.call(callback)
+
+    assert event.wait(timeout=2.0)
+    assert threads == [True]
+
+
+def test_channels_share_reactor_context(reactor):
+    from pymachinetalk.machinetalk_core.common.subscribe import Subscribe
+    from pymachinetalk.machinetalk_core.common.rpcclient import RpcClient
+
+    subscribe = Subscribe()
+    client = RpcClient()
+
+    assert subscribe._context is reactor.context
+    assert client._context is reactor.context
+
+
+def test_rpc_client_connects_through_reactor(reactor, context):
+    from pymachinetalk.machinetalk_core.common.rpcclient import RpcClient
+    import machinetalk.protobuf.types_pb2 as pb
+    from machinetalk.protobuf.message_pb2 import Container
+
+    server = context.socket(zmq.ROUTER)
+    port = server.bind_to_random_port('tcp://127.0.0.1')
+    client = RpcClient()
+    client.socket_uri = 'tcp://127.0.0.1:%i' % port
+    up = threading.Event()
+    client.on_state_changed.append(lambda state: state == 'up' and up.set())
+
+    client.start()
+    assert server.poll(2000)
+    identity, data = server.recv_multipart()
+    rx = Container()
+    rx.ParseFromString(data)
+    tx = Container()
+    tx.type = pb.MT_PING_ACKNOWLEDGE
+    server.send_multipart([identity, tx.SerializeToString()])
+
+    assert rx.type == pb.MT_PING
+    assert up.wait(timeout=2.0)
+    client.stop()
+    server.close()
+
+
+def test_subscribe_receives_through_reactor(reactor, context):
+    from pymachinetalk.machinetalk_core.common.subscribe import Subscribe
+    import machinetalk.protobuf.types_pb2 as pb
+    from machinetalk.protobuf.message_pb2 import Container
+
+    publisher = context.socket(zmq.XPUB)
+    port = publisher.bind_to_random_port('tcp://127.0.0.1')
+    subscribe = Subscribe()
+    subscribe.socket_uri = 'tcp://127.0.0.1:%i' % port
+    subscribe.add_socket_topic('foo')
+    received = []
+    event = threading.Event()
+
+    def message_received(topic, rx):
+        received.append((topic, rx.type))
+        event.set()
+
+    subscribe.on_socket_message_received.append(message_received)
+
+    subscribe.start()
+    assert publisher.poll(2000)
+    publisher.recv()  # subscription
+    tx = Container()
+    tx.type = pb.MT_FULL_UPDATE
+    publisher.send_multipart([b'foo', tx.SerializeToString()])
+
+    assert event.wait(timeout=2.0)
+    assert received == [('foo', pb.MT_FULL_UPDATE)]
+    subscribe.stop()
+    publisher.close()
+
+
+def test_priority_calls_run_before_queued_calls(reactor):
+    blocked = threading.Event()
+    done = threading.Event()
+    calls = []
+
+    reactor.call(blocked.wait, 2.0)
+    reactor.call(calls.append, 'first')
+    reactor.call(calls.append, 'second')
+    reactor.call_priority(calls.append, 'priority')
+    reactor.call(done.set)
+    blocked.set()
+
+    assert done.wait(timeout=2.0)
+    assert calls == ['priority', 'first', 'second']
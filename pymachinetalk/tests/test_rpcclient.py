@@ -0,0 +1,217 @@
+# coding=utf-8
+import sys
+import threading
+import time
+
+import pytest
+import zmq
+
+
+@pytest.fixture
+def context():
+    context = zmq.Context()
+    context.linger = 0
+    yield context
+    context.term()
+
+
+@pytest.fixture
+def server(context):
+    server = context.socket(zmq.ROUTER)
+    yield server
+    server.close()
+
+
+def test_priority_pipe_is_forwarded_first_and_discards_queue(reactor, context, mocker):
+    from pymachinetalk.machinetalk_core.common.rpcclient import RpcClient
+
+    client = RpcClient()
+    sockets = []
+    for name in ('pipe', 'priority'):
+        push = context.socket(zmq.PUSH)
+        push.bind('inproc://test-%s' % name)
+        pull = context.socket(zmq.PULL)
+        pull.connect('inproc://test-%s' % name)
+        sockets.append((push, pull))
+    (pipe, pipe_rx), (priority, priority_rx) = sockets
+    for i in range(10):  # queued with the tickets 1 to 10
+        pipe.send_multipart(((i + 1).to_bytes(8, 'little'), b'%i' % i))
+    pipe.send_multipart((bytes(8), b'ping'))  # messages without a ticket are kept
+    socket = mocker.Mock()
+
+    def send(data, flags):
+        if data == b'0':
+            # an abort arrives while the queued messages are forwarded
+            client.discard_queued_messages(6)
+            priority.send(b'p')
+
+    socket.send.side_effect = send
+
+    assert pipe_rx.poll(1000)
+    client._pipe_readable(pipe_rx, socket, priority_rx)
+
+    sent = [args[0] for args, _ in socket.send.call_args_list]
+    assert sent == [b'0', b'p'] + [b'%i' % i for i in range(5, 10)] + [b'ping']
+    for push, pull in sockets:
+        push.close()
+        pull.close()
+
+
+def connect(command, server):
+    channel = command._command_channel
+    port = server.bind_to_random_port('tcp://127.0.0.1')
+    channel.socket_uri = 'tcp://127.0.0.1:%i' % port
+    channel.start()
+    assert server.poll(2000)
+    server.recv_multipart()  # ping
+    command.connected = True
+
+
+def receive_commands(server, count):
+    import machinetalk.protobuf.types_pb2 as pb
+    from machinetalk.protobuf.message_pb2 import Container
+
+    rx = Container()
+    received = []
+    while len(received) < count:
+        assert server.poll(2000)
+        _, data = server.recv_multipart()
+        rx.ParseFromString(data)
+        if rx.type != pb.MT_PING:
+            received.append((rx.type, rx.ticket))
+    return received
+
+
+def test_abort_discards_large_backlog(reactor, server):
+    from pymachinetalk.application import ApplicationCommand
+    import machinetalk.protobuf.types_pb2 as pb
+
+    command = ApplicationCommand()
+    connect(command, server)
+
+    blocked = threading.Event()
+    reactor.call(blocked.wait, 2.0)  # backlog builds up while the loop is busy
+    for i in range(500):  # stays below the high water mark of the socket
+        queued = command.execute_mdi('G0 X%i' % i)
+    queued_future = command.executed_future(queued)
+    ticket = command.abort()
+    sent = time.perf_counter()
+    after = command.execute_mdi('G0 X0')  # commands after the abort are kept
+    blocked.set()
+
+    received = receive_commands(server, 1)
+    latency = time.perf_counter() - sent
+    received += receive_commands(server, 1)
+
+    assert received == [
+        (pb.MT_EMC_TASK_ABORT, ticket),
+        (pb.MT_EMC_TASK_PLAN_EXECUTE, after),
+    ]
+    assert not server.poll(100)  # the aborted backlog is never sent
+    assert latency < 0.5
+    assert queued_future.cancelled()
+    assert command.ticket == after
+    command._command_channel.stop()
+
+
+def test_concurrent_pings_do_not_share_the_message(reactor):
+    from pymachinetalk.machinetalk_core.common.rpcclient import RpcClient
+
+    client = RpcClient()
+    errors = []
+
+    def ping():
+        try:
+            for _ in range(500):
+                client.send_ping()
+        except Exception as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # provoke thread switches during serialization
+    try:
+        threads = [threading.Thread(target=ping) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert errors == []
+
+
+def test_socket_worker_sends_and_receives(server):
+    from pymachinetalk.machinetalk_core.common.rpcclient import RpcClient
+    import machinetalk.protobuf.types_pb2 as pb
+    from machinetalk.protobuf.message_pb2 import Container
+
+    # without a reactor the client runs its own socket worker thread
+    port = server.bind_to_random_port('tcp://127.0.0.1')
+    client = RpcClient()
+    client.socket_uri = 'tcp://127.0.0.1:%i' % port
+    received = []
+    event = threading.Event()
+
+    def message_received(rx):
+        received.append(rx.type)
+        event.set()
+
+    client.on_socket_message_received.append(message_received)
+    client.start()
+    for msg_type in (pb.MT_EMC_TASK_PLAN_EXECUTE, pb.MT_EMC_TASK_PLAN_STEP):
+        client.send_socket_message(msg_type, Container())
+    client.send_socket_message(pb.MT_EMC_TASK_ABORT, Container(), priority=True)
+
+    rx = Container()
+    types = []
+    while len(types) < 4:
+        assert server.poll(2000)
+        identity, data = server.recv_multipart()
+        rx.ParseFromString(data)
+        types.append(rx.type)
+    tx = Container(type=pb.MT_EMCCMD_EXECUTED)
+    server.send_multipart([identity, tx.SerializeToString()])
+
+    assert event.wait(timeout=2.0)
+    assert received == [pb.MT_EMCCMD_EXECUTED]
+    assert sorted(types) == sorted(
+        (
+            pb.MT_PING,
+            pb.MT_EMC_TASK_PLAN_EXECUTE,
+            pb.MT_EMC_TASK_PLAN_STEP,
+            pb.MT_EMC_TASK_ABORT,
+        )
+    )
+    assert client._fsm.isstate('up')
+    client.close()
+
+
+def test_command_racing_an_abort_is_discarded(channel_mode, server, mocker):
+    from pymachinetalk.application import ApplicationCommand
+    import machinetalk.protobuf.types_pb2 as pb
+
+    command = ApplicationCommand()
+    connect(command, server)
+    send_command_message = command.send_command_message
+    aborts = []
+
+    def send_racing_abort(msg_type, tx, priority=False):
+        if not aborts and not priority:
+            # the abort is sent after this command took its ticket
+            aborts.append(command.abort())
+        send_command_message(msg_type, tx, priority=priority)
+
+    mocker.patch.object(command, 'send_command_message', send_racing_abort)
+    racing = command.execute_mdi('G0 X1')
+    after = command.execute_mdi('G0 X2')
+
+    assert receive_commands(server, 2) == [
+        (pb.MT_EMC_TASK_ABORT, aborts[0]),
+        (pb.MT_EMC_TASK_PLAN_EXECUTE, after),
+    ]
+    assert not server.poll(100)  # the racing command is never sent
+    assert racing < aborts[0] < after
+    assert command.executed_future(racing).cancelled()
+    assert not command.executed_future(after).done()
+    command._command_channel.close()
@@ -0,0 +1,228 @@
+# coding=utf-8
+import threading
+import time
+
+import pytest
+import zmq
+
+
+@pytest.fixture
+def publisher():
+    context = zmq.Context()
+    context.linger = 0
+    socket = context.socket(zmq.XPUB)
+    port = socket.bind_to_random_port('tcp://127.0.0.1')
+    yield socket, 'tcp://127.0.0.1:%i' % port
+    socket.close()
+    context.term()
+
+
+@pytest.fixture
+def subscribe(channel_mode, publisher):
+    from pymachinetalk.machinetalk_core.common.subscribe import Subscribe
+
+    subscribe = Subscribe()
+    subscribe.socket_uri = publisher[1]
+    subscribe.add_socket_topic('foo')
+    subscribe.received = []
+    subscribe.event = threading.Event()
+
+    def message_received(topic, rx):
+        subscribe.received.append((topic, rx.type))
+        subscribe.event.set()
+
+    subscribe.on_socket_message_received.append(message_received)
+    yield subscribe
+    subscribe.close()
+
+
+def publish(publisher, topic, msg_type):
+    from machinetalk.protobuf.message_pb2 import Container
+
+    socket, _ = publisher
+    tx = Container()
+    tx.type = msg_type
+    socket.send_multipart([topic, tx.SerializeToString()])
+
+
+def start(subscribe, publisher):
+    socket, _ = publisher
+    subscribe.start()
+    assert socket.poll(2000)
+    socket.recv()  # subscription
+
+
+def test_zero_copy_receive_parses_frames(subscribe, publisher):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    subscribe.socket_zero_copy = True
+    start(subscribe, publisher)
+
+    publish(publisher, b'foo', pb.MT_FULL_UPDATE)
+
+    assert subscribe.event.wait(timeout=2.0)
+    assert subscribe.received == [('foo', pb.MT_FULL_UPDATE)]
+
+
+def test_subscribed_topics_are_decoded_once(subscribe, publisher):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    start(subscribe, publisher)
+
+    publish(publisher, b'foo', pb.MT_FULL_UPDATE)
+
+    assert subscribe.event.wait(timeout=2.0)
+    assert subscribe._socket_topic_cache == {b'foo': 'foo'}
+
+
+@pytest.mark.parametrize('channel_mode', ['reactor'], indirect=True)
+def test_pending_messages_are_drained_in_batches(reactor, subscribe, publisher):
+    import machinetalk.protobuf.types_pb2 as pb
+
+    subscribe.socket_batch_size = 4
+    start(subscribe, publisher)
+    blocked = threading.Event()
+    reactor.call(lambda: blocked.wait(timeout=2.0))  # let messages queue up
+
+    for _ in range(10):
+        publish(publisher, b'foo', pb.MT_FULL_UPDATE)
+    time.sleep(0.1)
+    blocked.set()
+
+    for _ in range(100):
+        if subscribe.socket_message_count == 10:
+            break
+        time.sleep(0.01)
+    assert subscribe.socket_message_count == 10
+    assert subscribe.socket_max_batch_size == 4
+    assert subscribe.socket_batch_count == 3
+
+
+def test_metrics_are_recorded_when_enabled(subscribe, publisher):
+    import machinetalk.protobuf.types_pb2 as pb
+    from pymachinetalk.machinetalk_core.common.metrics import ChannelMetrics
+
+    subscribe.metrics = ChannelMetrics()
+    start(subscribe, publisher)
+
+    publish(publisher, b'foo', pb.MT_FULL_UPDATE)
+
+    assert subscribe.event.wait(timeout=2.0)
+    for _ in range(100):  # recorded after the callbacks returned
+        if subscribe.metrics.callback_ns.count:
+            break
+        time.sleep(0.01)
+    assert subscribe.metrics.messages_received == 1
+    assert subscribe.metrics.bytes_received > 0
+    assert subscribe.metrics.parse_ns.count == 1
+    assert subscribe.metrics.callback_ns.count == 1
+
+
+def test_state_changes_and_receives_are_traced(subscribe, publisher):
+    import machinetalk.protobuf.types_pb2 as pb
+    from pymachinetalk.machinetalk_core.common.trace import RingBufferTracer
+
+    subscribe.tracer = RingBufferTracer()
+    start(subscribe, publisher)
+
+    publish(publisher, b'foo', pb.MT_FULL_UPDATE)
+
+    assert subscribe.event.wait(timeout=2.0)
+    events = [(event.kind, event.name) for event in subscribe.tracer.events()]
+    assert ('state', 'TRYING') in events
+    assert ('receive', pb.MT_FULL_UPDATE) in events
+    assert ('state', 'UP') in events
+
+
+def test_decode_errors_are_logged(subscribe, publisher, caplog):
+    socket, _ = publisher
+    start(subscribe, publisher)
+
+    socket.send_multipart([b'foo', b'\xff'])
+    for _ in range(100):
+        if 'Protobuf Decode Error' in caplog.text:
+            break
+        time.sleep(0.01)
+
+    assert 'Protobuf Decode Error' in caplog.text
+
+
+def test_simple_subscribe_receives_messages(channel_mode, publisher):
+    from pymachinetalk.machinetalk_core.common.simplesubscribe import SimpleSubscribe
+    import machinetalk.protobuf.types_pb2 as pb
+
+    subscribe = SimpleSubscribe()
+    subscribe.socket_uri = publisher[1]
+    subscribe.add_socket_topic('foo')
+    received = []
+    event = threading.Event()
+
+    def message_received(topic, rx):
+        received.append((topic, rx.type))
+        event.set()
+
+    subscribe.on_socket_message_received.append(message_received)
+    start(subscribe, publisher)
+
+    publish(publisher, b'foo', pb.MT_LOG_MESSAGE)
+
+    assert event.wait(timeout=2.0)
+    assert received == [('foo', pb.MT_LOG_MESSAGE)]
+    subscribe.close()
+
+
+@pytest.mark.parametrize(
+    'module, name',
+    [
+        ('application.statussubscribe', 'StatusSubscribe'),
+        ('application.errorsubscribe', 'ErrorSubscribe'),
+        ('halremote.halrcompsubscribe', 'HalrcompSubscribe'),
+    ],
+)
+def test_generated_subscribers_receive_without_reactor(module, name, publisher):
+    import importlib
+    import machinetalk.protobuf.types_pb2 as pb
+
+    module = importlib.import_module('pymachinetalk.machinetalk_core.' + module)
+    subscribe = getattr(module, name)()
+    subscribe.socket_uri = publisher[1]
+    subscribe.add_socket_topic('foo')
+    received = []
+    event = threading.Event()
+
+    def message_received(topic, rx):
+        received.append((topic, rx.type))
+        event.set()
+
+    subscribe.on_socket_message_received.append(message_received)
+    start(subscribe, publisher)
+
+    publish(publisher, b'foo', pb.MT_EMC_OPERATOR_TEXT)
+
+    assert event.wait(timeout=2.0)
+    assert received == [('foo', pb.MT_EMC_OPERATOR_TEXT)]
+    subscribe.close()
+
+
+def test_error_subscribe_applies_keepalive_of_pings(channel_mode, publisher):
+    from pymachinetalk.machinetalk_core.application.errorsubscribe import (
+        ErrorSubscribe,
+    )
+    from machinetalk.protobuf.message_pb2 import Container
+    import machinetalk.protobuf.types_pb2 as pb
+
+    subscribe = ErrorSubscribe()
+    subscribe.socket_uri = publisher[1]
+    subscribe.add_socket_topic('error')
+    up = threading.Event()
+    subscribe.on_state_changed.append(lambda state: state == 'up' and up.set())
+    start(subscribe, publisher)
+
+    tx = Container()
+    tx.type = pb.MT_PING
+    tx.pparams.keepalive_timer = 500
+    publisher[0].send_multipart([b'error', tx.SerializeToString()])
+
+    assert up.wait(timeout=2.0)
+    assert subscribe._heartbeat_interval == 500
+    subscribe.close()
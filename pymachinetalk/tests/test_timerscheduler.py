@@ -0,0 +1,79 @@
+# coding=utf-8
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def scheduler():
+    from pymachinetalk.machinetalk_core.common.timerscheduler import TimerScheduler
+
+    return TimerScheduler()
+
+
+def test_timer_fires_once(scheduler):
+    fired = []
+    event = threading.Event()
+
+    def tick():
+        fired.append(time.monotonic())
+        event.set()
+
+    timer = scheduler.create_timer(tick)
+    timer.start(0.01)
+
+    assert event.wait(timeout=1.0)
+    time.sleep(0.05)
+    assert len(fired) == 1
+    assert not timer.active
+
+
+def test_restarting_timer_postpones_deadline(scheduler):
+    event = threading.Event()
+    timer = scheduler.create_timer(event.set)
+    start = time.monotonic()
+    timer.start(0.05)
+
+    for _ in range(5):
+        time.sleep(0.02)
+        timer.start(0.05)
+
+    assert event.wait(timeout=1.0)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_restarting_timer_with_shorter_interval_fires_early(scheduler):
+    event = threading.Event()
+    timer = scheduler.create_timer(event.set)
+    timer.start(10.0)
+
+    timer.start(0.01)
+
+    assert event.wait(timeout=1.0)
+
+
+def test_cancelled_timer_does_not_fire(scheduler):
+    event = threading.Event()
+    timer = scheduler.create_timer(event.set)
+    timer.start(0.02)
+
+    timer.cancel()
+
+    assert not event.wait(timeout=0.1)
+    assert not timer.active
+
+
+def test_restarting_timers_creates_no_threads(scheduler):
+    timers = [scheduler.create_timer(lambda: None) for _ in range(10)]
+    for timer in timers:
+        timer.start(1.0)
+    threads = threading.active_count()
+
+    for _ in range(100):
+        for timer in timers:
+            timer.start(1.0)
+
+    assert threading.active_count() == threads
+    for timer in timers:
+        timer.cancel()
@@ -0,0 +1,67 @@
+# coding=utf-8
+import pytest
+
+
+@pytest.fixture
+def trace():
+    from pymachinetalk.machinetalk_core.common import trace
+
+    yield trace
+    trace.set_default_tracer(None)
+
+
+def test_tracing_is_disabled_by_default(trace):
+    assert trace.get_tracer() is None
+    assert isinstance(trace.get_tracer(debuglevel=1), trace.PrintTracer)
+
+
+def test_default_tracer_is_used_by_new_objects(trace, reactor):
+    from pymachinetalk.machinetalk_core.application.statusbase import StatusBase
+
+    tracer = trace.RingBufferTracer(capacity=2)
+    trace.set_default_tracer(tracer)
+
+    status = StatusBase(debugname='status')
+    status.status_uri = 'inproc://status-trace'
+    status.start()
+
+    assert status.tracer is tracer
+    assert status._status_channel.tracer is tracer
+    assert len(tracer.events()) == 2
+    assert all(event.source.startswith('status') for event in tracer.events())
+    status.stop()
+
+
+def test_ring_buffer_keeps_messages_as_text(trace):
+    from machinetalk.protobuf.message_pb2 import Container
+    import machinetalk.protobuf.types_pb2 as pb
+
+    tracer = trace.RingBufferTracer(keep_messages=True)
+
+    tracer('rpc', 'send', pb.MT_PING, Container(type=pb.MT_PING))
+
+    assert tracer.events()[0].message == 'type: MT_PING\n'
+
+
+def test_logging_tracer_logs_events(trace, caplog):
+    import logging
+
+    tracer = trace.LoggingTracer()
+
+    with caplog.at_level(logging.DEBUG, logger='pymachinetalk'):
+        tracer('status', 'state', 'UP')
+
+    assert '[status]: state UP' in caplog.text
+
+
+def test_setting_debuglevel_updates_tracer(trace, reactor):
+    from pymachinetalk.machinetalk_core.application.statusbase import StatusBase
+
+    status = StatusBase()
+    assert status.tracer is None
+
+    status.debuglevel = 2
+    assert isinstance(status.tracer, trace.PrintTracer)
+    assert status.tracer.verbose
+    status.debuglevel = 0
+    assert status.tracer is None
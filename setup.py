@@ -37,6 +37,9 @@ if __name__ == '__main__':
         namespace_packages=['pymachinetalk'],
         packages=find_packages(),
         install_requires=requirements,
-        extras_require={'dev': ['pytest', 'pytest-mock', 'pytest-pep8', 'pytest-cov']},
+        extras_require={
+            'dev': ['pytest', 'pytest-mock', 'pytest-pep8', 'pytest-cov'],
+            'numpy': ['numpy'],
+        },
         cmdclass={'clean': clean, 'build_py': build_py},
     )